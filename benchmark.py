@@ -0,0 +1,329 @@
+"""離線重播與效能測試：不需要螢幕、滑鼠或 GUI
+
+用法:
+    python benchmark.py recordings/ --templates templates/ --labels labels.json
+    python benchmark.py session.mp4 --templates templates/ --pyramid-levels 0 --json result.json
+    python benchmark.py recordings/ --config bot.json --fps 15
+
+直接執行 HunterBot.main_loop（場景辨識、點擊確認與重試、各步驟的等待都與實際執行相同），
+擷取改為重播錄製的畫面，輸入改為不送出事件的 FakeInput。等待與逾時使用依錄影前進的虛擬時鐘：
+每擷取一幀前進 1/fps 秒，sleep 期間錄影繼續播放，被略過的幀就是實際執行時來不及看的畫面。
+錄製畫面本身已包含點擊後的結果，點擊只會被記錄。
+
+labels.json 格式: {"<檔名或幀編號>": ["login_button", "boss/fox2", ...]}，列出該幀上「應該」找到的模板；
+沒有出現在 labels 裡的幀不列入命中率統計。命中率以另一個只做完整比對的 FrameMatcher 計算，
+不影響主循環的 ROI 與畫面變化閘門。
+
+結束碼: 0 = 完成，1 = 沒有讀到任何幀，2 = 模板不齊（缺少的模板會列在錯誤訊息中）
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from botConfig import load_config
+from botCore import HunterBot
+from botLogging import LEVELS, logger, setup_logging
+from botState import BotState, TEMPLATE_KEYS
+from frameMatcher import Frame, FrameMatcher
+from inputDriver import FakeInput
+from screenCapture import CaptureBackend, ReplayCapture, ReplayFinished
+
+
+class ReplayClock:
+    """虛擬時鐘：sleep 不真的等待，只讓時間前進"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class TimedReplay(CaptureBackend):
+    """依虛擬時鐘重播：第 i 幀代表錄影中的 i / fps 秒，擷取時取目前時間對應的幀
+
+    連續擷取（中間沒有 sleep）取到相鄰的幀；on_frame(frame, name) 在每次擷取後呼叫，不計入擷取耗時。
+    """
+    name = "replay"
+
+    def __init__(self, replay, clock, fps, max_frames=None, on_frame=None):
+        super().__init__()
+        self.replay = replay
+        self.clock = clock
+        self.fps = fps
+        self.max_frames = max_frames
+        self.on_frame = on_frame
+        self.position = 0  # 下一個未讀取的幀
+        self.grabbed = 0
+        self.grab_times = []
+
+    @property
+    def current_name(self):
+        return self.replay.current_name
+
+    def screen_size(self):
+        return self.replay.screen_size()
+
+    def grab(self, region=None, keep_color=False):
+        target = max(self.position, int(self.clock.now * self.fps))
+        if self.max_frames is not None and target >= self.max_frames:
+            raise ReplayFinished(self.replay.source)
+        started = time.perf_counter()
+        self.replay.skip(target - self.position)
+        gray, rgb = self.replay.grab(region, keep_color)
+        self.grab_times.append(time.perf_counter() - started)
+        self.position = target + 1
+        self.grabbed += 1
+        self.clock.now = max(self.clock.now, self.position / self.fps)
+        if self.on_frame: self.on_frame(gray, self.current_name)
+        return gray, rgb
+
+    def close(self):
+        self.replay.close()
+
+
+class ReplayBot(HunterBot):
+    """記錄狀態轉換、Boss 偵測與每幀比對耗時的 HunterBot"""
+
+    def __init__(self, config, capture, clock):
+        self.transitions = []  # (frame name, from, to)
+        self.boss_events = []  # (frame name, boss key, score)
+        self.restarts = 0
+        self._last_state = None
+        self._match_time = {}  # frame seq -> 該幀所有比對的總耗時
+        super().__init__(config, on_status=self._on_status, capture=capture, input_driver=FakeInput())
+        self.clock = clock
+        self.replay = capture
+
+    def _on_status(self, text):
+        if text in vars(BotState).values() and text != self._last_state:
+            if self._last_state is not None:
+                self.transitions.append((self.replay.current_name, self._last_state, text))
+            self._last_state = text
+
+    @property
+    def matcher(self):
+        created = self._matcher is None
+        matcher = super().matcher
+        if created:
+            match = matcher.match
+
+            def timed_match(frame, keys):
+                started = time.perf_counter()
+                try:
+                    return match(frame, keys)
+                finally:
+                    self._match_time[frame.seq] = self._match_time.get(frame.seq, 0.0) + time.perf_counter() - started
+            matcher.match = timed_match
+        return matcher
+
+    def match_bosses(self, frame):
+        hit, best = super().match_bosses(frame)
+        if hit is not None: self.boss_events.append((self.replay.current_name, hit.key, hit.score))
+        return hit, best
+
+    def match_times(self):
+        return list(self._match_time.values())
+
+
+class LabelScorer:
+    """在標註過的幀上以獨立的 FrameMatcher 做完整比對，統計各模板的 TP / FP / FN / TN
+
+    每次都清掉學到的 ROI 並關閉變化閘門，結果只取決於這一幀，也不會改變主循環 matcher 的狀態。
+    """
+
+    def __init__(self, bot, labels):
+        self.bot = bot
+        self.labels = labels
+        self.counts = {}
+        self.elapsed = 0.0  # 不計入重播耗時
+        self._matcher = None
+
+    def __call__(self, gray, name):
+        expected = self.labels.get(name)
+        if expected is None: return
+        started = time.perf_counter()
+        matcher = self._ensure_matcher()
+        matcher.learned_rois.clear()
+        keys = [k for k in TEMPLATE_KEYS if self.bot.templates[k] is not None] + matcher.banks.get("boss", [])
+        for key, result in matcher.match(Frame(gray.copy()), keys).items():
+            counts = self.counts.setdefault(key, {"tp": 0, "fp": 0, "fn": 0, "tn": 0})
+            counts[("tp" if result.found else "fn") if key in expected else ("fp" if result.found else "tn")] += 1
+        self.elapsed += time.perf_counter() - started
+
+    def _ensure_matcher(self):
+        if self._matcher is None:
+            source = self.bot.matcher
+            matcher = FrameMatcher(self.bot.templates, source.threshold, capture=source.capture_backend)
+            matcher.thresholds = source.thresholds
+            matcher.banks = source.banks
+            matcher.bank_templates = source.bank_templates
+            matcher.change_gating = False
+            # 沿用主循環找到的尺度，但自己不搜尋
+            matcher.scale_search = source.scale_search
+            matcher.scales = source.scales
+            matcher.scale_miss_limit = float("inf")
+            self._matcher = matcher
+        return self._matcher
+
+
+def replay_config(args):
+    """以設定檔為基礎，關閉所有會寫檔、開網路或真的等待的功能"""
+    config = load_config(args.config)
+    if args.templates:
+        config["templates"] = {key: None for key in TEMPLATE_KEYS}
+        config["manifest"] = config["user_manifest"] = None
+    if args.boss_bank: config["boss_bank"] = args.boss_bank
+    elif args.templates: config["boss_bank"] = None
+    if args.threshold is not None: config["confidence"] = args.threshold
+    if args.pyramid_levels is not None: config["pyramid_levels"] = args.pyramid_levels
+    if args.no_change_gating: config["change_gating"] = False
+    config["scale_search"].update(enabled=args.scale_search, store=None)
+    config["scan_duration"] = args.scan_frames / args.fps
+    config["scan_interval"] = 0
+    config["pipeline"]["enabled"] = False
+    config["recorder"]["enabled"] = False
+    config["scenes"]["store"] = None
+    config["channels"].update(count=0, ocr_roi=None, history=None)
+    config["input"]["delays"] = {}
+    config["metrics"].update(port=None, dump_file=None)
+    config["webhook"]["url"] = ""
+    return config
+
+
+def load_templates(directory):
+    templates = {key: None for key in TEMPLATE_KEYS}
+    if not directory: return templates
+    for filename in os.listdir(directory):
+        stem, ext = os.path.splitext(filename)
+        if stem in templates and ext.lower() in (".png", ".jpg", ".jpeg"):
+            templates[stem] = cv2.imread(os.path.join(directory, filename), cv2.IMREAD_GRAYSCALE)
+    return templates
+
+
+def percentiles(samples):
+    if not samples: return {}
+    values = np.array(samples) * 1000.0
+    result = {f"p{p}": float(np.percentile(values, p)) for p in (50, 90, 99)}
+    result.update(max=float(values.max()), mean=float(values.mean()))
+    return result
+
+
+def run(args):
+    labels = {}
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = {str(k): set(v) for k, v in json.load(f).items()}
+
+    clock = ReplayClock()
+    capture = TimedReplay(ReplayCapture(args.source), clock, args.fps, args.max_frames)
+    bot = ReplayBot(replay_config(args), capture, clock)
+    if args.templates:
+        for filename in sorted(os.listdir(args.templates)):
+            stem, ext = os.path.splitext(filename)
+            if stem in bot.templates and ext.lower() in (".png", ".jpg", ".jpeg"):
+                bot.load_template(stem, os.path.join(args.templates, filename))
+        if bot.config["boss_bank"] and os.path.isdir(bot.config["boss_bank"]):
+            bot.load_boss_bank(bot.config["boss_bank"])
+    else:
+        bot.load_configured_templates()
+    missing = bot.missing_templates()
+    if missing:
+        # 模板不齊時主循環只會停在判斷場景，報告沒有意義；結束碼與 hunter.py 相同
+        logger.error("缺少模板: %s", ", ".join(missing))
+        bot.close()
+        raise SystemExit(2)
+    bot.set_pyramid_levels(bot.pyramid_levels)
+    scorer = LabelScorer(bot, labels)
+    capture.on_frame = scorer
+
+    started = time.perf_counter()
+    try:
+        # 與監控程式相同：因找不到畫面元素而停止時重新開始
+        while True:
+            bot.run()
+            if not bot.failed: break
+            bot.restarts += 1
+    except ReplayFinished:
+        bot.stop("重播結束")
+    finally:
+        elapsed = time.perf_counter() - started - scorer.elapsed
+        bot.close()
+    matcher = bot.matcher
+
+    return {
+        "source": args.source,
+        "frames": capture.grabbed,
+        "skipped_frames": capture.position - capture.grabbed,
+        "replayed_s": clock.now,
+        "elapsed_s": elapsed,
+        "fps": capture.grabbed / elapsed if elapsed else 0.0,
+        "capture_ms": percentiles(capture.grab_times),
+        "match_ms": percentiles(bot.match_times()),
+        "matcher": {"threshold": bot.confidence, "pyramid_levels": bot.pyramid_levels,
+                    "change_gating": matcher.change_gating, "scale_search": matcher.scale_search,
+                    "scales": dict(matcher.scales), "stats": dict(matcher.stats)},
+        "templates": {k: v for k, v in sorted(scorer.counts.items()) if sum(v.values())},
+        "transitions": bot.transitions,
+        "boss_events": bot.boss_events,
+        "clicks": [(action, arg) for _, action, arg in bot.input.backend.actions],
+        "restarts": bot.restarts,
+        "final_state": bot._last_state,
+    }
+
+
+def print_report(report):
+    print(f"來源: {report['source']}  幀數: {report['frames']} (略過 {report['skipped_frames']})  "
+          f"錄影時間: {report['replayed_s']:.1f}s  耗時: {report['elapsed_s']:.2f}s  FPS: {report['fps']:.1f}")
+    for stage in ("capture_ms", "match_ms"):
+        p = report[stage]
+        if p: print(f"  {stage:<11} p50={p['p50']:.2f} p90={p['p90']:.2f} p99={p['p99']:.2f} max={p['max']:.2f} mean={p['mean']:.2f}")
+    print(f"  比對統計: {report['matcher']['stats']}")
+    if report["templates"]:
+        print("模板命中率 (依標註):")
+        for key, c in report["templates"].items():
+            recall = c["tp"] / (c["tp"] + c["fn"]) if c["tp"] + c["fn"] else float("nan")
+            precision = c["tp"] / (c["tp"] + c["fp"]) if c["tp"] + c["fp"] else float("nan")
+            print(f"  {key:<28} TP={c['tp']:<4} FP={c['fp']:<4} FN={c['fn']:<4} TN={c['tn']:<4} "
+                  f"precision={precision:.3f} recall={recall:.3f}")
+    print(f"狀態轉換 {len(report['transitions'])} 次，點擊 / 按鍵 {len(report['clicks'])} 次，"
+          f"重新啟動 {report['restarts']} 次，最終狀態: {report['final_state']}")
+    for name, key, score in report["boss_events"]:
+        print(f"  Boss [{key}] 於 {name}，信心度 {score:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="離線重播錄製畫面並測量偵測延遲與命中率")
+    parser.add_argument("source", help="圖片資料夾或影片檔")
+    parser.add_argument("--config", help="JSON 設定檔；等待時間、場景辨識、輸入重試等設定與實際執行相同")
+    parser.add_argument("--templates", help="模板資料夾，檔名需與模板 key 相同 (例如 login_button.png)；未指定時依設定檔載入")
+    parser.add_argument("--boss-bank", help="Boss 圖庫資料夾 (例如 static/boss)")
+    parser.add_argument("--labels", help="每幀應出現的模板標註 (JSON)")
+    parser.add_argument("--threshold", type=float, help="信心度，預設取設定檔")
+    parser.add_argument("--pyramid-levels", type=int, help="預設取設定檔")
+    parser.add_argument("--no-change-gating", action="store_true")
+    parser.add_argument("--scale-search", action="store_true", help="錄製畫面與模板解析度不同時自動搜尋模板尺度")
+    parser.add_argument("--fps", type=float, default=10.0, help="錄製畫面的幀率，決定虛擬時鐘的速度")
+    parser.add_argument("--scan-frames", type=int, default=150, help="每個頻道掃描幾幀後換頻")
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--log-level", choices=list(LEVELS), default="WARNING")
+    parser.add_argument("--json", help="將結果寫入 JSON 檔，方便在 CI 比較")
+    args = parser.parse_args(argv)
+
+    setup_logging(LEVELS[args.log_level], console=True)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["frames"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,42 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+import argparse
+import collections
 import threading
 import time
-import pyautogui
+import os
+import logging
 import cv2
 import numpy as np
-import requests
-import io
-
-# Using the previous scene-aware state machine
-class BotState:
-    DETERMINING_STATE = "DETERMINING_STATE"
-    LOGIN_SCREEN = "LOGIN_SCREEN"
-    CHAR_SELECT = "CHAR_SELECT"
-    IN_GAME_SCANNING = "IN_GAME_SCANNING"
-    OPENING_CHANNEL_LIST = "OPENING_CHANNEL_LIST"
-    SWITCHING_CHANNEL = "SWITCHING_CHANNEL"
-    STOPPED = "STOPPED"
-
+from botConfig import load_config
+from botCore import HunterBot
+from botLogging import LEVELS, logger, setup_logging
+from botMetrics import format_summary
+from botState import SCENE_NAMES
+from frameMatcher import find_peaks
 
 class GameBot:
-    def __init__(self):
+    """Tk 前端：狀態機與比對都在 HunterBot，這裡只負責設定、測試按鈕與顯示日誌"""
+
+    def __init__(self, config=None):
+        config = config or load_config()
         self.root = tk.Tk()
         self.root.title("Artale Boss Hunter (Optimized)")
         self.root.geometry("550x850") # Adjusted height for confidence slider
 
-        self.bot_thread = None
-        self.is_running = False
-        self.current_state = BotState.STOPPED
-        self.boss_detected = False  # 新增：記錄是否偵測到 Boss
-
-        self.templates = {
-            "login_scene_indicator": None, "char_select_scene_indicator": None,
-            "login_button": None, "char_select_button": None, "boss_indicator": None,
-            "menu_channel_button": None, "switch_channel_button": None, "confirm_button": None,
-        }
+        # 日誌先寫入環狀緩衝區，由 Tk mainloop 定時批次顯示；設定檔或 BOSS_LOG_FILE 可另外輸出到輪替檔案
+        log_config = config["logging"]
+        self.log_ring = setup_logging(LEVELS[log_config["level"]], log_file=log_config["file"], max_bytes=log_config["max_bytes"],
+                                      backups=log_config["backups"], capacity=log_config["capacity"])
+        self._gui_calls = collections.deque()  # 背景執行緒要求的 GUI 更新
+        self.bot = HunterBot(config, on_status=self.show_status, on_stopped=self.on_bot_stopped)
+        self.templates = self.bot.templates
         self.setup_gui()
+        self.matcher = self.bot.matcher
+        self.bot.load_configured_templates()
+        for key, path in self.bot.template_paths.items():
+            self.template_labels[key].config(text=f"狀態: 已載入 ({os.path.basename(path)})")
+        self.update_boss_bank_label()
 
     def setup_gui(self):
         main_frame = ttk.Frame(self.root, padding="10")
@@ -53,19 +54,41 @@ class GameBot:
         for key, name in {"login_button": "登入遊戲 按鈕", "char_select_button": "選擇角色 按鈕", "boss_indicator": "Boss 出現指示器", "menu_channel_button": "ESC選單中的[頻道]按鈕", "switch_channel_button": "頻道列表中的[換頻]按鈕", "confirm_button": "確認換頻 按鈕"}.items():
             ttk.Button(template_frame, text=f"載入 {name}", command=lambda k=key: self.load_template(k)).pack(fill=tk.X, pady=2)
             label = ttk.Label(template_frame, text="狀態: 未載入"); label.pack(); self.template_labels[key] = label
+        ttk.Label(template_frame, text="--- Boss 圖庫 (可同時偵測多隻 Boss) ---", font=("Arial", 10, "bold")).pack(pady=(10,0))
+        ttk.Button(template_frame, text="載入 Boss 圖庫資料夾", command=self.choose_boss_bank).pack(fill=tk.X, pady=2)
+        self.boss_bank_label = ttk.Label(template_frame, text="狀態: 未載入"); self.boss_bank_label.pack()
 
         # --- Settings Frame with Confidence Slider ---
         settings_frame = ttk.LabelFrame(main_frame, text="2. 辨識設定", padding="10")
         settings_frame.pack(fill=tk.X, expand=True, pady=5)
         ttk.Label(settings_frame, text="辨識信心度 (越高越嚴格):").pack(anchor='w')
-        self.confidence_var = tk.DoubleVar(value=0.8)
+        self.confidence_var = tk.DoubleVar(value=self.bot.confidence)
+        # 背景執行緒讀取一般的 float，不直接碰 Tk 變數
+        self.confidence_var.trace_add("write", lambda *_: setattr(self.bot, "confidence", self.confidence_var.get()))
         self.confidence_scale = ttk.Scale(settings_frame, from_=0.5, to=0.95, orient=tk.HORIZONTAL, variable=self.confidence_var)
         self.confidence_scale.pack(fill=tk.X, pady=5)
         self.confidence_label = ttk.Label(settings_frame, text=f"{self.confidence_var.get():.2f}")
         self.confidence_label.pack()
         self.confidence_scale.config(command=lambda v: self.confidence_label.config(text=f"{float(v):.2f}"))
+        # 金字塔模式：先在縮小畫面找候選位置，再以原解析度確認，信心度意義不變
+        self.pyramid_var = tk.BooleanVar(value=self.bot.pyramid_levels > 0)
+        ttk.Checkbutton(settings_frame, text="Boss 掃描使用金字塔加速", variable=self.pyramid_var,
+                        command=self.apply_pyramid_setting).pack(anchor='w', pady=(5, 0))
+        # 畫面靜止時沿用上一幀的比對結果，只重新比對有變化的區域
+        self.change_gating_var = tk.BooleanVar(value=self.bot.config["change_gating"])
+        ttk.Checkbutton(settings_frame, text="畫面未變化時略過比對", variable=self.change_gating_var,
+                        command=self.apply_change_gating_setting).pack(anchor='w')
+        # 多尺度：解析度或顯示縮放不同時自動找出模板尺度，找到後只用該尺度比對
+        self.scale_search_var = tk.BooleanVar(value=self.bot.config["scale_search"]["enabled"])
+        ttk.Checkbutton(settings_frame, text="自動適應解析度 / 顯示縮放", variable=self.scale_search_var,
+                        command=lambda: self.bot.set_scale_search(self.scale_search_var.get())).pack(anchor='w')
 
 
+        ttk.Label(settings_frame, text="Discord Webhook URL:").pack(anchor='w', pady=(10, 0))
+        self.webhook_var = tk.StringVar(value=self.bot.config["webhook"]["url"])
+        self.webhook_var.trace_add("write", lambda *_: self.apply_webhook_setting())
+        ttk.Entry(settings_frame, textvariable=self.webhook_var).pack(fill=tk.X, pady=2)
+
         # --- Controls ---
         control_frame = ttk.LabelFrame(main_frame, text="3. 控制", padding="10")
         control_frame.pack(fill=tk.X, expand=True, pady=5)
@@ -77,158 +100,115 @@ class GameBot:
         # Add test button for debugging
         test_frame = ttk.Frame(control_frame)
         test_frame.pack(fill=tk.X, pady=5)
-        ttk.Button(test_frame, text="測試登入按鈕識別", command=self.test_login_button).pack(fill=tk.X)
-        ttk.Button(test_frame, text="測試Boss指示器識別", command=self.test_boss_indicator).pack(fill=tk.X)
-        ttk.Button(test_frame, text="模擬實際掃描流程", command=self.simulate_scanning).pack(fill=tk.X)
-        ttk.Button(test_frame, text="詳細Boss偵測分析", command=self.detailed_boss_analysis).pack(fill=tk.X)
+        # 會擷取畫面的測試按鈕在掛機時停用：擷取後端與 matcher 的狀態不能同時由兩個執行緒使用
+        self.capture_buttons = []
+        for text, command in [("測試登入按鈕識別", self.test_login_button), ("測試Boss指示器識別", self.test_boss_indicator),
+                              ("模擬實際掃描流程", self.simulate_scanning), ("詳細Boss偵測分析", self.detailed_boss_analysis)]:
+            self.capture_buttons.append(ttk.Button(test_frame, text=text, command=command))
+            self.capture_buttons[-1].pack(fill=tk.X)
         ttk.Button(test_frame, text="測試Discord通知", command=self.test_discord_webhook).pack(fill=tk.X)
+        for text, command in [("測試頻道辨識 (OCR)", self.test_channel_ocr), ("測試場景辨識", self.test_scene)]:
+            self.capture_buttons.append(ttk.Button(test_frame, text=text, command=command))
+            self.capture_buttons[-1].pack(fill=tk.X)
+        ttk.Button(test_frame, text="效能統計", command=self.show_metrics).pack(fill=tk.X)
+        self.metrics_window = None
 
         # --- Status & Log ---
         status_frame = ttk.LabelFrame(main_frame, text="4. 狀態與日誌", padding="10")
         status_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         self.status_label = ttk.Label(status_frame, text="當前狀態: 已停止", font=("Arial", 12))
         self.status_label.pack(pady=5)
+        level_frame = ttk.Frame(status_frame)
+        level_frame.pack(fill=tk.X)
+        ttk.Label(level_frame, text="日誌等級:").pack(side=tk.LEFT)
+        self.log_level_var = tk.StringVar(value=logging.getLevelName(logger.level))
+        level_box = ttk.Combobox(level_frame, textvariable=self.log_level_var, values=list(LEVELS), state="readonly", width=10)
+        level_box.pack(side=tk.LEFT, padx=5)
+        level_box.bind("<<ComboboxSelected>>", lambda _: logger.setLevel(LEVELS[self.log_level_var.get()]))
         self.log_text = tk.Text(status_frame, height=12, state=tk.DISABLED)
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.root.after(100, self.drain_gui_queue)
+
+    def apply_pyramid_setting(self):
+        self.bot.set_pyramid_levels((self.bot.config["pyramid_levels"] or 2) if self.pyramid_var.get() else 0)
+
+    def apply_change_gating_setting(self):
+        self.bot.set_change_gating(self.change_gating_var.get())
+
+    def apply_webhook_setting(self):
+        self.bot.config["webhook"]["url"] = self.webhook_var.get().strip()
+        self.bot.notifier.webhook_url = self.bot.config["webhook"]["url"]
 
-    def update_status(self, text):
-        self.status_label.config(text=f"當前狀態: {text}")
-        self.log(f"狀態變更 -> {text}")
+    def choose_boss_bank(self):
+        directory = filedialog.askdirectory(initialdir=self.bot.config["boss_bank"])
+        if not directory: return
+        self.bot.load_boss_bank(directory)
+        self.update_boss_bank_label()
 
-    def log(self, message):
-        timestamp = time.strftime("%H:%M:%S")
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks()
+    def update_boss_bank_label(self):
+        keys = self.matcher.banks.get("boss", [])
+        names = ", ".join(self.bot.boss_name(k) for k in keys)
+        self.boss_bank_label.config(text=f"狀態: 已載入 {len(keys)} 隻 ({names})" if keys else "狀態: 未載入")
+
+    def show_status(self, text):
+        self.call_in_gui(lambda: self.status_label.config(text=f"當前狀態: {text}"))
+
+    def log(self, message, *args, level=logging.INFO):
+        """可從任何執行緒呼叫；args 只在該等級啟用時才會格式化"""
+        logger.log(level, message, *args)
+
+    def call_in_gui(self, func):
+        """背景執行緒不能直接操作 Tk 元件，排入佇列由 mainloop 執行"""
+        if threading.current_thread() is threading.main_thread(): func()
+        else: self._gui_calls.append(func)
+
+    def drain_gui_queue(self):
+        while self._gui_calls:
+            self._gui_calls.popleft()()
+        lines = self.log_ring.drain()
+        if lines:
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            # 畫面上只保留環狀緩衝區容量內的行數
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - self.log_ring.capacity
+            if excess > 0: self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+        self.root.after(100, self.drain_gui_queue)
 
     def load_template(self, key):
         path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg")])
         if not path: return
-        # Load as grayscale directly for consistency
-        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        if image is None:
+        if not self.bot.load_template(key, path, remember=True):
             messagebox.showerror("錯誤", "無法讀取圖片")
             return
-        self.templates[key] = image
-        self.template_labels[key].config(text=f"狀態: 已載入 ({path.split('/')[-1]})")
-        self.log(f"成功載入灰階模板: {key}")
-
-    def is_image_on_screen(self, template_key):
-        if self.templates[template_key] is None: return False
-        
-        # Take screenshot and convert to grayscale
-        screenshot = pyautogui.screenshot()
-        screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-        
-        template = self.templates[template_key]
-        if template.shape[0] > screen_cv.shape[0] or template.shape[1] > screen_cv.shape[1]:
-            return False
-
-        # Match using the grayscale template on the grayscale screen
-        result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(result)
-        
-        # Use confidence from the slider
-        return max_val >= self.confidence_var.get()
-
-    def find_and_click(self, template_key, timeout=5):
-        self.log(f"正在尋找並點擊 [{template_key}]...")
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if not self.is_running: return None
-            
-            # Convert screen to grayscale for matching
-            screenshot = pyautogui.screenshot()
-            screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-            template = self.templates[template_key]
-
-            if template.shape[0] > screen_cv.shape[0] or template.shape[1] > screen_cv.shape[1]:
-                self.log(f"錯誤: [{template_key}] 模板比螢幕大")
-                return None
-            
-            result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-            if max_val >= self.confidence_var.get():
-                h, w = template.shape # Get shape from grayscale template
-                
-                center_pos = (max_loc[0] + w // 2, max_loc[1] + h // 2)
-                self.log(f"  > 找到 [{template_key}] 於 {center_pos}，信心度 {max_val:.2f}，點擊它。")
-                pyautogui.click(center_pos)
-                # 立即返回，不等待
-                return center_pos
-            else:
-                # Add debugging info for login button specifically
-                if template_key == "login_button":
-                    self.log(f"  > 當前最高信心度: {max_val:.3f} (需要 {self.confidence_var.get():.3f})")
-                # Add debugging info for character select button
-                elif template_key == "char_select_button":
-                    self.log(f"  > 當前最高信心度: {max_val:.3f} (需要 {self.confidence_var.get():.3f})")
-            
-            time.sleep(0.1)
-        
-        self.log(f"提示: {timeout}秒內找不到 [{template_key}]")
-        return None
-
-    def scan_for_boss(self, duration=15):
-        self.log(f"開始掃描 Boss，持續 {duration} 秒...")
-        start_time = time.time()
-        scan_count = 0
-        while time.time() - start_time < duration:
-            if not self.is_running: return False
-            
-            scan_count += 1
-            # 檢查 Boss 指示器
-            if self.is_image_on_screen("boss_indicator"):
-                self.log("🎉🎉🎉 偵測到 BOSS！ 🎉🎉🎉")
-                self.boss_detected = True  # 設置 Boss 偵測標記
-                # 不停止，繼續運作
-                return False  # 返回 False 讓機器人繼續到下一個狀態
-            else:
-                # 每10次掃描顯示一次調試資訊（因為現在掃描更頻繁）
-                if scan_count % 10 == 0:
-                    # 獲取當前信心度
-                    screenshot = pyautogui.screenshot()
-                    screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-                    template = self.templates["boss_indicator"]
-                    result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-                    _, max_val, _, _ = cv2.minMaxLoc(result)
-                    self.log(f"掃描中... 第{scan_count}次檢查，Boss指示器最高信心度: {max_val:.3f} (需要 {self.confidence_var.get():.3f})")
-                    
-                    # 如果信心度接近但未達到閾值，記錄下來
-                    if max_val >= self.confidence_var.get() * 0.7:  # 70% 的閾值
-                        self.log(f"⚠️ 接近偵測閾值！信心度: {max_val:.3f}")
-                        # 保存接近閾值的截圖
-                        # screenshot.save(f"near_threshold_{int(time.time())}.png")
-                        # self.log("已保存接近閾值的截圖")
-            
-            time.sleep(0.1)  # 更頻繁的檢查
-        
-        self.log("掃描結束，未發現 Boss。")
-        return False
+        self.template_labels[key].config(text=f"狀態: 已載入 ({os.path.basename(path)})")
 
     def start_bot(self):
-        if any(t is None for t in self.templates.values()):
+        if self.bot.missing_templates():
             messagebox.showwarning("模板未載入", "請先載入所有模板圖片！")
             return
         
-        self.is_running = True
-        self.current_state = BotState.DETERMINING_STATE
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
-        
-        self.bot_thread = threading.Thread(target=self.main_loop, daemon=True)
-        self.bot_thread.start()
+        for button in self.capture_buttons: button.config(state=tk.DISABLED)
+        self.bot.start()
 
     def stop_bot(self):
-        if not self.is_running: return
-        self.is_running = False
-        self.current_state = BotState.STOPPED
+        self.bot.stop()
+
+    def on_bot_stopped(self, reason):
+        self.call_in_gui(lambda: self.stop_button.config(state=tk.DISABLED))
+        self.call_in_gui(self.reset_buttons_when_idle)
+
+    def reset_buttons_when_idle(self):
+        """主循環執行緒可能還在擷取或比對，等它結束後才重新開放開始與測試按鈕"""
+        thread = self.bot.bot_thread
+        if thread is not None and thread.is_alive():
+            self.root.after(100, self.reset_buttons_when_idle)
+            return
         self.start_button.config(state=tk.NORMAL)
-        self.stop_button.config(state=tk.DISABLED)
-        self.update_status("已手動停止")
+        for button in self.capture_buttons: button.config(state=tk.NORMAL)
 
     def test_login_button(self):
         """測試登入按鈕識別功能"""
@@ -238,35 +218,31 @@ class GameBot:
         
         self.log("=== 開始測試登入按鈕識別 ===")
         
-        # 截圖並轉換為灰階
-        screenshot = pyautogui.screenshot()
-        screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
+        # 擷取一幀並進行模板匹配
+        frame = self.matcher.capture()
         template = self.templates["login_button"]
         
         # 檢查模板大小
-        self.log(f"螢幕大小: {screen_cv.shape[1]}x{screen_cv.shape[0]}")
+        self.log(f"螢幕大小: {frame.width}x{frame.height}")
         self.log(f"模板大小: {template.shape[1]}x{template.shape[0]}")
         
-        if template.shape[0] > screen_cv.shape[0] or template.shape[1] > screen_cv.shape[1]:
+        result = self.matcher.match_one(frame, "login_button")
+        if not result.valid:
             self.log("錯誤: 模板比螢幕大！")
             return
-        
-        # 進行模板匹配
-        result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        max_val = result.score
         
         self.log(f"最高信心度: {max_val:.4f}")
-        self.log(f"最佳匹配位置: {max_loc}")
-        self.log(f"當前信心度設定: {self.confidence_var.get():.2f}")
+        self.log(f"最佳匹配位置: {result.loc}")
+        self.log(f"當前信心度設定: {result.threshold:.2f}")
         
-        if max_val >= self.confidence_var.get():
-            h, w = template.shape
-            center_pos = (max_loc[0] + w // 2, max_loc[1] + h // 2)
+        if result.found:
+            center_pos = frame.to_screen(result.center)
             self.log(f"✅ 找到登入按鈕！位置: {center_pos}")
             
             # 詢問是否要點擊
             if messagebox.askyesno("測試", f"找到登入按鈕於位置 {center_pos}\n信心度: {max_val:.4f}\n是否要點擊？"):
-                pyautogui.click(center_pos)
+                self.bot.input.click(center_pos)
                 self.log("已點擊登入按鈕")
         else:
             self.log("❌ 未找到登入按鈕")
@@ -285,35 +261,31 @@ class GameBot:
         
         self.log("=== 開始測試Boss指示器識別 ===")
         
-        # 截圖並轉換為灰階
-        screenshot = pyautogui.screenshot()
-        screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
+        # 擷取一幀並進行模板匹配
+        frame = self.matcher.capture()
         template = self.templates["boss_indicator"]
         
         # 檢查模板大小
-        self.log(f"螢幕大小: {screen_cv.shape[1]}x{screen_cv.shape[0]}")
+        self.log(f"螢幕大小: {frame.width}x{frame.height}")
         self.log(f"模板大小: {template.shape[1]}x{template.shape[0]}")
         
-        if template.shape[0] > screen_cv.shape[0] or template.shape[1] > screen_cv.shape[1]:
+        result = self.matcher.match_one(frame, "boss_indicator")
+        if not result.valid:
             self.log("錯誤: 模板比螢幕大！")
             return
-        
-        # 進行模板匹配
-        result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        max_val = result.score
         
         self.log(f"最高信心度: {max_val:.4f}")
-        self.log(f"最佳匹配位置: {max_loc}")
-        self.log(f"當前信心度設定: {self.confidence_var.get():.2f}")
+        self.log(f"最佳匹配位置: {result.loc}")
+        self.log(f"當前信心度設定: {result.threshold:.2f}")
         
-        if max_val >= self.confidence_var.get():
-            h, w = template.shape
-            center_pos = (max_loc[0] + w // 2, max_loc[1] + h // 2)
+        if result.found:
+            center_pos = frame.to_screen(result.center)
             self.log(f"✅ 找到Boss指示器！位置: {center_pos}")
             
             # 詢問是否要點擊
             if messagebox.askyesno("測試", f"找到Boss指示器於位置 {center_pos}\n信心度: {max_val:.4f}\n是否要點擊？"):
-                pyautogui.click(center_pos)
+                self.bot.input.click(center_pos)
                 self.log("已點擊Boss指示器")
         else:
             self.log("❌ 未找到Boss指示器")
@@ -326,8 +298,8 @@ class GameBot:
 
     def simulate_scanning(self):
         """模擬實際掃描流程"""
-        if self.templates["boss_indicator"] is None:
-            messagebox.showwarning("錯誤", "請先載入Boss指示器模板！")
+        if not self.bot.boss_keys():
+            messagebox.showwarning("錯誤", "請先載入Boss指示器模板或Boss圖庫！")
             return
         
         self.log("=== 開始模擬實際掃描流程 ===")
@@ -346,19 +318,16 @@ class GameBot:
         while time.time() - start_time < duration:
             scan_count += 1
             
-            # 檢查 Boss 指示器
-            if self.is_image_on_screen("boss_indicator"):
-                self.log("🎉🎉🎉 模擬掃描中偵測到 BOSS！ 🎉🎉🎉")
+            # 檢查 Boss 指示器（與實際掃描相同，每個 tick 只擷取一次）
+            frame = self.matcher.capture()
+            hit, result = self.bot.match_bosses(frame)
+            if hit is not None:
+                self.log(f"🎉🎉🎉 模擬掃描中偵測到 BOSS [{self.bot.boss_name(hit.key)}]！ 🎉🎉🎉")
                 return
             
             # 每2秒顯示一次調試資訊
             if scan_count % 20 == 0:  # 因為現在是0.1秒間隔，所以20次=2秒
-                screenshot = pyautogui.screenshot()
-                screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
-                template = self.templates["boss_indicator"]
-                result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, _ = cv2.minMaxLoc(result)
-                self.log(f"模擬掃描中... 信心度: {max_val:.3f} (需要 {self.confidence_var.get():.3f})")
+                self.log(f"模擬掃描中... 信心度: {result.score:.3f} [{self.bot.boss_name(result.key)}] (需要 {result.threshold:.3f})")
             
             time.sleep(0.1)
         
@@ -373,36 +342,38 @@ class GameBot:
         
         self.log("=== 開始詳細Boss偵測分析 ===")
         
-        # 保存當前截圖
-        screenshot = pyautogui.screenshot()
-        screenshot.save(f"current_screen_{int(time.time())}.png")
-        self.log("已保存當前螢幕截圖")
+        # 保存當前截圖（背景執行緒編碼寫檔，不卡住介面）
+        frame = self.matcher.capture(keep_color=True)
+        saved = self.bot.save_snapshot(frame, "analysis", self.matcher.match_one(frame, "boss_indicator"))
+        if saved: self.log(f"已保存當前螢幕截圖: {saved}.png")
         
-        # 轉換為灰階
-        screen_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2GRAY)
+        screen_cv = frame.gray
         template = self.templates["boss_indicator"]
         
         # 進行模板匹配
-        result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
+        result = self.matcher.score_map(frame, "boss_indicator")
+        if result is None:
+            self.log("錯誤: 模板比螢幕大！")
+            return
         _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        # 與實際掃描相同：校正過的模板閾值優先於信心度設定
+        threshold = self.matcher.thresholds.get("boss_indicator", self.bot.confidence)
         
         self.log(f"=== 詳細分析結果 ===")
         self.log(f"螢幕大小: {screen_cv.shape[1]}x{screen_cv.shape[0]}")
         self.log(f"模板大小: {template.shape[1]}x{template.shape[0]}")
         self.log(f"最高信心度: {max_val:.4f}")
         self.log(f"最佳匹配位置: {max_loc}")
-        self.log(f"當前信心度設定: {self.confidence_var.get():.2f}")
-        self.log(f"是否達到閾值: {'是' if max_val >= self.confidence_var.get() else '否'}")
+        self.log(f"當前閾值: {threshold:.2f}" + (" (校正值)" if "boss_indicator" in self.matcher.thresholds else ""))
+        self.log(f"是否達到閾值: {'是' if max_val >= threshold else '否'}")
         
-        # 顯示前5個最佳匹配位置
+        # 顯示前5個互不重疊的最佳匹配位置
         self.log("前5個最佳匹配位置:")
-        for i in range(min(5, len(result.flatten()))):
-            # 找到第i個最大值的位置
-            flat_result = result.flatten()
-            indices = np.argsort(flat_result)[::-1]
-            row, col = np.unravel_index(indices[i], result.shape)
-            confidence = flat_result[indices[i]]
+        h, w = template.shape
+        for i, (confidence, (col, row)) in enumerate(find_peaks(result, 5, radius=(w // 2 + 1, h // 2 + 1))):
             self.log(f"  位置 {i+1}: ({col}, {row}), 信心度: {confidence:.4f}")
+        hits = self.matcher.find_all(frame, "boss_indicator", threshold=threshold, scores=result)
+        self.log(f"達到閾值的位置共 {len(hits)} 個" + (f": {[hit.loc for hit in hits]}" if hits else ""))
         
         # 分析模板的統計資訊
         template_mean = np.mean(template)
@@ -420,147 +391,65 @@ class GameBot:
 
     def test_discord_webhook(self):
         """測試Discord webhook功能"""
-        webhook_url = "https://discord.com/api/webhooks/1386667578851594321/_ZE9Le1nYCB285f3Tn1aixfRPOrS0xH9fYa2TNeV-ptXhjRBgF-SymDiH3axqJKvkgWb"
-        payload = {"content": "🤖 測試訊息：Boss偵測機器人已連線！"}
-        
-        try:
-            self.log("正在發送測試訊息到 Discord...")
-            response = requests.post(webhook_url, json=payload)
-            
-            if 200 <= response.status_code < 300:
-                self.log("✅ Discord 測試訊息發送成功！")
-            else:
-                self.log(f"❌ Discord 測試訊息發送失敗: {response.status_code}, {response.text}")
-        except Exception as e:
-            self.log(f"❌ 發送 Discord 測試訊息時發生錯誤: {e}")
-
-    def determine_initial_state(self):
-        self.log("正在判斷當前遊戲場景...")
-        
-        # 嘗試多次識別場景，給遊戲更多載入時間
-        for attempt in range(5):  # 嘗試5次
-            self.log(f"第 {attempt + 1} 次嘗試識別場景...")
-            
-            # 先檢查是否在登入畫面
-            if self.is_image_on_screen("login_scene_indicator"):
-                self.log("判斷結果: 位於登入畫面。")
-                return BotState.LOGIN_SCREEN
-            # 再檢查是否在角色選擇畫面
-            elif self.is_image_on_screen("char_select_scene_indicator"):
-                self.log("判斷結果: 位於角色選擇畫面。")
-                return BotState.CHAR_SELECT
-            
-            # 如果不是最後一次嘗試，等待一下再重試
-            if attempt < 4:
-                self.log("無法識別場景，等待2秒後重試...")
-                time.sleep(2)
-        
-        # 如果5次都無法識別，回到登入畫面重新開始
-        self.log("5次嘗試後仍無法識別場景，回到登入畫面重新開始...")
-        return BotState.LOGIN_SCREEN
+        self.log("正在發送測試訊息到 Discord...")
+        self.bot.notifier.notify("🤖 測試訊息：Boss偵測機器人已連線！")
 
-    def main_loop(self):
-        while self.is_running:
-            self.update_status(self.current_state)
-            
-            if self.current_state == BotState.DETERMINING_STATE:
-                self.current_state = self.determine_initial_state()
-                if self.current_state == BotState.STOPPED: self.stop_bot()
-            elif self.current_state == BotState.LOGIN_SCREEN:
-                if not self.is_image_on_screen("login_scene_indicator"):
-                    self.log("錯誤: 登入畫面的指示器消失了，重新判斷場景。")
-                    self.current_state = BotState.DETERMINING_STATE
-                    continue
-                self.log("場景已確認，等待2秒確保按鈕載入...")
-                time.sleep(2)
-                if self.find_and_click("login_button"):
-                    self.log("點擊登入按鈕成功，等待畫面切換...")
-                    time.sleep(5)
-                    self.current_state = BotState.DETERMINING_STATE
-                else: self.stop_bot()
-            elif self.current_state == BotState.CHAR_SELECT:
-                self.log("進入角色選擇狀態，等待1秒確保畫面載入...")
-                time.sleep(1)
-                
-                # 先確認我們還在角色選擇畫面
-                if not self.is_image_on_screen("char_select_scene_indicator"):
-                    self.log("錯誤: 角色選擇畫面的指示器消失了，重新判斷場景。")
-                    self.current_state = BotState.DETERMINING_STATE
-                    continue
-                
-                if self.find_and_click("char_select_button", timeout=3):
-                    self.log("點擊角色選擇成功，立即開始掃描 Boss...")
-                    self.current_state = BotState.IN_GAME_SCANNING
-                else:
-                    self.log("找不到角色選擇按鈕，重新判斷場景...")
-                    self.current_state = BotState.DETERMINING_STATE
-            elif self.current_state == BotState.IN_GAME_SCANNING:
-                if self.scan_for_boss(): 
-                    self.log("偵測到 Boss，但繼續運作...")
-                    # 繼續到下一個狀態而不是停止
-                    self.current_state = BotState.OPENING_CHANNEL_LIST
-                else: 
-                    self.current_state = BotState.OPENING_CHANNEL_LIST
-            elif self.current_state == BotState.OPENING_CHANNEL_LIST:
-                pyautogui.press('esc')
-                time.sleep(1)
-                if self.find_and_click("menu_channel_button"):
-                    self.current_state = BotState.SWITCHING_CHANNEL
-                    time.sleep(2)
-                else:
-                    self.log("在ESC選單中找不到頻道按鈕，回到遊戲中...")
-                    pyautogui.press('esc')
-                    self.current_state = BotState.IN_GAME_SCANNING
-            elif self.current_state == BotState.SWITCHING_CHANNEL:
-                # 如果偵測到 Boss，先擷取圖片
-                if self.boss_detected:
-                    self.log("偵測到 Boss，先擷取頻道切換畫面...")
-                    screenshot = pyautogui.screenshot()
-                    # screenshot.save(f"boss_channel_switch_{int(time.time())}.png")
-                    # self.log("已保存 Boss 頻道切換截圖")
-                    
-                    # 發送到 Discord
-                    webhook_url = "https://discord.com/api/webhooks/1386667578851594321/_ZE9Le1nYCB285f3Tn1aixfRPOrS0xH9fYa2TNeV-ptXhjRBgF-SymDiH3axqJKvkgWb"
-                    payload = {"content": "🎉🎉🎉 偵測到 BOSS！ 🎉🎉🎉"}
-                    
-                    try:
-                        # 將截圖轉換為 bytes
-                        with io.BytesIO() as image_binary:
-                            screenshot.save(image_binary, 'PNG')
-                            image_binary.seek(0)
-                            
-                            # 準備檔案資料
-                            files = {
-                                'file': ('boss_detected.png', image_binary.getvalue(), 'image/png')
-                            }
-                            
-                            # 發送訊息和圖片
-                            self.log("正在發送 Boss 偵測通知到 Discord...")
-                            response = requests.post(webhook_url, data=payload, files=files)
-                        
-                        if 200 <= response.status_code < 300:
-                            self.log("✅ Discord 通知發送成功！")
-                        else:
-                            self.log(f"❌ Discord 通知發送失敗: {response.status_code}")
-                    except Exception as e:
-                        self.log(f"❌ 發送 Discord 通知時發生錯誤: {e}")
-                    
-                    self.boss_detected = False  # 重置標記
-                
-                if not self.find_and_click("switch_channel_button"): self.stop_bot(); continue
-                time.sleep(1)
-                if not self.find_and_click("confirm_button"): self.stop_bot(); continue
-                self.log("頻道切換中，等待15秒讓遊戲重新載入...")
-                time.sleep(15)
-                self.log("頻道切換完成，重新判斷遊戲場景...")
-                self.current_state = BotState.DETERMINING_STATE
-        self.log("主循環已結束。")
+    def test_channel_ocr(self):
+        """讀取目前頻道並列出頻道紀錄與下一個建議頻道"""
+        if not self.bot.config["channels"]["ocr_roi"]:
+            messagebox.showinfo("頻道辨識", "請先在設定檔的 channels.ocr_roi 設定頻道編號所在區域 [x, y, w, h]")
+            return
+        frame = self.bot.matcher.capture()
+        started = time.perf_counter()
+        channel = self.bot.read_channel(frame)
+        self.log(f"頻道辨識結果: {channel}，耗時 {(time.perf_counter() - started) * 1000:.1f} ms")
+        if self.bot.config["channels"]["count"]:
+            scheduler = self.bot.channel_scheduler
+            self.log(f"下一個建議頻道: {scheduler.pick(channel)}")
+            for ch, entry in sorted(self.bot.channel_history.channels.items()):
+                self.log(f"  頻道 {ch}: 造訪 {entry['visits']} 次，Boss {len(entry['sightings'])} 次，分數 {scheduler.score(ch):.2f}")
+
+    def test_scene(self):
+        """辨識目前畫面的場景，列出各場景的縮圖特徵分數"""
+        frame = self.bot.matcher.capture()
+        classifier = self.bot.scene_classifier
+        if classifier is not None:
+            for scene, score in sorted(classifier.scores(frame).items(), key=lambda item: -item[1]):
+                self.log(f"  {SCENE_NAMES.get(scene, scene)}: {score:.3f}")
+        started = time.perf_counter()
+        scene = self.bot.classify_scene(frame)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.log(f"場景辨識結果: {SCENE_NAMES.get(scene, '無法判斷')}，耗時 {elapsed:.1f} ms")
+
+    def show_metrics(self):
+        """開啟效能統計視窗，每 2 秒更新一次"""
+        if self.metrics_window is not None and self.metrics_window.winfo_exists():
+            self.metrics_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title("效能統計")
+        window.geometry("760x360")
+        text = tk.Text(window, font=("Courier", 9), state=tk.DISABLED)
+        text.pack(fill=tk.BOTH, expand=True)
+        ttk.Button(window, text="歸零", command=self.bot.metrics.reset).pack(pady=2)
+        self.metrics_window = window
+
+        def refresh():
+            if not window.winfo_exists(): return
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, format_summary(self.bot.metrics, limit=20) or "尚無資料，開始掛機或執行測試後會顯示。")
+            text.config(state=tk.DISABLED)
+            window.after(2000, refresh)
+        refresh()
 
     def run_gui(self):
-        pyautogui.FAILSAFE = True
-        pyautogui.PAUSE = 0.2
         self.root.mainloop()
+        self.bot.close()
 
 if __name__ == "__main__":
-    bot = GameBot()
+    parser = argparse.ArgumentParser(description="Artale Boss Hunter 圖形介面")
+    parser.add_argument("--config", help="JSON 設定檔（模板路徑、閾值、等待時間、webhook、日誌）")
+    args = parser.parse_args()
+    bot = GameBot(load_config(args.config))
     bot.run_gui()
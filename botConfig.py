@@ -0,0 +1,122 @@
+import copy
+import json
+import os
+from botState import TEMPLATE_KEYS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CONFIG = {
+    # 模板 key -> 圖片路徑；相對路徑以設定檔所在資料夾為準。場景指示器沒有隨附，需自行截圖後指定
+    "templates": {key: None for key in TEMPLATE_KEYS},
+    # 模板清單：未在 templates 指定的 key 由清單自動載入；manifest 為隨附的清單，
+    # user_manifest 記錄 GUI 載入並記住的模板（不納入版本控制），同一個 key 以 user_manifest 為準
+    "manifest": os.path.join(BASE_DIR, "static", "templates.json"),
+    "user_manifest": os.path.join(BASE_DIR, ".cache", "templates.json"),
+    # 模板前處理快取資料夾；null 代表不使用快取
+    "template_cache": os.path.join(BASE_DIR, ".cache", "templates"),
+    # 多尺度比對：不同解析度 / 顯示縮放下自動找出模板尺度，依顯示器記錄在 store。
+    # 預設關閉：不在畫面上的模板也會定期搜尋，誤判的尺度會被記住；模板與遊戲解析度不同時再開啟
+    "scale_search": {
+        "enabled": False, "steps": [0.5, 0.67, 0.75, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 1.75, 2.0],
+        "miss_limit": 5, "store": os.path.join(BASE_DIR, ".cache", "scales.json"),
+    },
+    "boss_bank": os.path.join(BASE_DIR, "static", "boss"),
+    # 手動指定的搜尋範圍：模板 key -> [x, y, w, h]（擷取畫面內的座標）；先在範圍附近搜尋，找不到才搜尋全畫面
+    "rois": {},
+    "confidence": 0.8,
+    # calibrate.py 產生的各模板閾值，優先於 confidence；沒有校正過的模板仍使用 confidence
+    "thresholds": os.path.join(BASE_DIR, "static", "thresholds.json"),
+    "pyramid_levels": 2,
+    "change_gating": True,
+    # 畫面變化偵測：縮成 1/scale 後與上次重新比對時的內容相差超過 tolerance 才算變化（漸變會累積），未超過時沿用先前的結果；
+    # scale=1、tolerance=0 為逐像素精確比較（較慢）
+    "change_detector": {"scale": 4, "tile": 16, "tolerance": 6},
+    "capture_backend": "auto",
+    "scan_duration": 15,
+    "scan_interval": 0.1,
+    # Boss 掃描時以背景執行緒按目標幀率擷取，比對跟不上就丟棄舊幀；關閉時每次比對後等待 scan_interval
+    "pipeline": {"enabled": True, "fps": 15, "ring": 2},
+    # 各步驟最長等待秒數，畫面就緒就立即繼續
+    "deadlines": {
+        "determine_state": 10, "login_button": 7, "after_login": 5, "char_select_loaded": 1,
+        "channel_menu": 6, "channel_list": 2, "confirm_button": 6, "channel_switch": 15,
+    },
+    "webhook": {
+        "url": "", "max_retries": 5, "timeout": 10, "attachment_scale": 0.5, "attachment_format": "jpeg",
+    },
+    "logging": {"level": "INFO", "file": None, "max_bytes": 5 * 1024 * 1024, "backups": 3, "capacity": 2000},
+    # 輸入：backend 為 pyautogui 或 fake（不送出事件，試跑用）；delays 為各動作後的等待秒數，
+    # 可用 "click:<模板>" / "press:<按鍵>" 個別指定。點擊後在 verify_timeout 秒內沒有看到預期畫面就重試 retries 次
+    "input": {
+        "backend": "pyautogui", "failsafe": True, "delays": {"click": 0.05, "press": 0.05},
+        "verify_timeout": 1.5, "retries": 2,
+    },
+    # 掃描時保存偵測到 / 接近閾值 (near_threshold x 信心度) 的畫面與 .json 說明，作為標註資料；
+    # crop_margin 為 null 時保存整個畫面，否則只保存比對位置外擴的區域
+    "recorder": {
+        "enabled": False, "directory": os.path.join(BASE_DIR, "recordings"), "max_mb": 200, "workers": 2,
+        "crop_margin": None, "near_threshold": 0.7, "min_interval": 2.0,
+    },
+    # 場景辨識：以整個畫面的縮圖一次比對所有已知場景，不明確時才以模板確認；
+    # samples 為 <場景>/*.png 截圖資料夾（login, char_select, in_game, esc_menu, channel_list），
+    # 執行中以模板確認過的畫面會自動加入 store（每個場景最多 max_references 張，最多每 save_interval 秒寫檔一次）；
+    # 遊戲中沒有模板可確認，只有縮圖分數達到 exclusion_score 且其他場景都被模板排除時才判定為遊戲中
+    "scenes": {
+        "enabled": True, "samples": os.path.join(BASE_DIR, "static", "scenes"),
+        "store": os.path.join(BASE_DIR, ".cache", "scenes.npz"), "min_score": 0.9, "margin": 0.05,
+        "exclusion_score": 0.8, "max_references": 8, "save_interval": 60,
+    },
+    # 頻道追蹤：ocr_roi 為顯示頻道編號的視窗內區域 [x, y, w, h]；
+    # list_layout 為頻道列表上第 1 頻道的中心 first [x, y]、每列 columns 個、間距 step [dx, dy]，設定後依紀錄挑選下一個頻道
+    "channels": {
+        "count": 0, "ocr_roi": None, "tesseract_cmd": None, "list_layout": None,
+        "history": os.path.join(BASE_DIR, ".cache", "channels.json"), "respawn_seconds": 1800, "min_revisit": 120,
+    },
+    # 多開模式：每個視窗 {"name", "region": [x, y, w, h], "focus": [x, y]}，見 multiHunter.py
+    "clients": [],
+    # 效能指標：port 開啟 /metrics (Prometheus 格式)，dump_file 定期附加 .jsonl 或 .csv
+    "metrics": {"host": "127.0.0.1", "port": None, "dump_file": None, "dump_interval": 60},
+    "multi": {"capture_interval": 0.05, "restart_delay": 5, "request_timeout": 10, "shutdown_timeout": 10},
+}
+
+
+def _merge(base, override):
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _resolve(path, root):
+    if not path: return path
+    path = os.path.expanduser(path)
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(root, path))
+
+
+def load_config(path=None):
+    """讀取 JSON 設定檔並與預設值合併；環境變數 DISCORD_WEBHOOK_URL / BOSS_LOG_FILE 優先"""
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    root = BASE_DIR
+    if path:
+        with open(path, encoding="utf-8") as f:
+            _merge(config, json.load(f))
+        root = os.path.dirname(os.path.abspath(path))
+
+    config["templates"] = {key: _resolve(p, root) for key, p in config["templates"].items()}
+    config["rois"] = {key: tuple(int(v) for v in roi) for key, roi in config["rois"].items() if roi}
+    for key in ("manifest", "user_manifest", "template_cache", "boss_bank", "thresholds"):
+        config[key] = _resolve(config[key], root)
+    config["logging"]["file"] = _resolve(config["logging"]["file"], root)
+    config["metrics"]["dump_file"] = _resolve(config["metrics"]["dump_file"], root)
+    config["scale_search"]["store"] = _resolve(config["scale_search"]["store"], root)
+    config["channels"]["history"] = _resolve(config["channels"]["history"], root)
+    config["recorder"]["directory"] = _resolve(config["recorder"]["directory"], root)
+    for key in ("samples", "store"):
+        config["scenes"][key] = _resolve(config["scenes"][key], root)
+    if os.environ.get("DISCORD_WEBHOOK_URL"):
+        config["webhook"]["url"] = os.environ["DISCORD_WEBHOOK_URL"]
+    if os.environ.get("BOSS_LOG_FILE"):
+        config["logging"]["file"] = os.environ["BOSS_LOG_FILE"]
+    return config
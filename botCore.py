@@ -0,0 +1,678 @@
+import logging
+import os
+import threading
+import time
+from botConfig import load_config
+from botLogging import logger
+from botMetrics import Metrics, MetricsDumper, MetricsServer
+from botState import BotState, SCENE_INDICATORS, SCENE_NAMES, SCENE_STATES, TEMPLATE_KEYS
+
+
+class HunterBot:
+    """與 GUI 無關的狀態機與比對流程；GUI 與無介面模式 (hunter.py) 共用
+
+    cv2 / pyautogui / requests 都在第一次用到時才載入，啟動快、常駐記憶體小。
+    """
+
+    def __init__(self, config=None, on_status=None, on_stopped=None, capture=None, input_driver=None, name=None):
+        self.config = config or load_config()
+        self.name = name  # 多開模式的視窗名稱，會加在 Discord 通知前
+        self.on_status = on_status    # 狀態變更時呼叫 (text)，可能在背景執行緒
+        self.on_stopped = on_stopped  # 停止時呼叫 (reason)，可能在背景執行緒
+        self.bot_thread = None
+        self.is_running = False
+        self.failed = False  # 因找不到畫面元素而停止，交給外部監控程式重新啟動
+        self.current_state = BotState.STOPPED
+        self.boss_detected = False  # 新增：記錄是否偵測到 Boss
+        self.detected_boss = None   # 偵測到的 Boss 名稱
+        self.current_channel = None  # OCR 讀到的目前頻道，未設定或讀不到時為換頻時點選的頻道，都沒有時為 None
+        self._selected_channel = None  # 換頻成功後點選的頻道，等掃描開始時記為造訪
+
+        self.templates = {key: None for key in TEMPLATE_KEYS}
+        self.template_paths = {}
+        self.confidence = self.config["confidence"]
+        self.deadlines = dict(self.config["deadlines"])
+        self.scan_duration = self.config["scan_duration"]
+        self.scan_interval = self.config["scan_interval"]
+        self.pyramid_levels = self.config["pyramid_levels"]
+        self._matcher = None
+        self._notifier = None
+        self._capture = capture     # None 時依設定建立螢幕擷取後端
+        self._input_backend = input_driver  # 需提供 click(pos) / press(key)；None 時依設定建立 (inputDriver.py)
+        self._input = None
+        self.metrics = Metrics()
+        self._exporters = []
+        self._state_entered = None  # (state, perf_counter)
+        self._channel_reader = None
+        self._channel_history = None
+        self._channel_scheduler = None
+        self._recorder = None
+        self._snapshot_recorder = None
+        self._scene_classifier = None
+        self._menu_open = False  # 場景辨識發現 ESC 選單已開啟，開啟頻道列表時不再按 esc
+        self._cycle_started = None
+        # 提供 time() / sleep() 的時鐘，用於等待與逾時；離線重播 (benchmark.py) 換成依錄影前進的虛擬時鐘
+        self.clock = time
+
+    # --- lazily created components ---
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            from frameMatcher import ChangeDetector, FrameMatcher
+            from screenCapture import create_capture
+            from templateStore import TemplateCache
+            cache_dir = self.config["template_cache"]
+            self._matcher = FrameMatcher(self.templates, lambda: self.confidence, rois=self.config["rois"],
+                                         capture=self._capture or create_capture(self.config["capture_backend"]),
+                                         template_cache=TemplateCache(cache_dir) if cache_dir else None)
+            self._matcher.change_gating = self.config["change_gating"]
+            self._matcher.change_detector = ChangeDetector(**self.config["change_detector"])
+            self._matcher.cache_levels = self.pyramid_levels
+            self._matcher.metrics = self.metrics
+            self._setup_scale_search(self._matcher)
+            self._load_thresholds(self._matcher)
+            self.log(f"螢幕擷取方式: {self._matcher.capture_backend.name}")
+        return self._matcher
+
+    @property
+    def notifier(self):
+        if self._notifier is None:
+            from notifier import NotificationDispatcher
+            webhook = self.config["webhook"]
+            self._notifier = NotificationDispatcher(
+                webhook["url"], log=self.log, max_retries=webhook["max_retries"], timeout=webhook["timeout"],
+                attachment_scale=webhook["attachment_scale"], attachment_format=webhook["attachment_format"])
+            self._notifier.start()
+        return self._notifier
+
+    @property
+    def input(self):
+        if self._input is None:
+            from inputDriver import create_input
+            self._input = create_input(self.config["input"], self._input_backend)
+        return self._input
+
+    def _setup_scale_search(self, matcher):
+        from templateStore import load_scales
+        config = self.config["scale_search"]
+        matcher.scale_search = config["enabled"]
+        matcher.scale_steps = tuple(config["steps"])
+        matcher.scale_miss_limit = config["miss_limit"]
+        self.display = "%dx%d" % tuple(matcher.capture_backend.screen_size())
+        matcher.scales.update(load_scales(config["store"], self.display))
+        matcher.on_scale_change = self._on_scale_change
+
+    def _load_thresholds(self, matcher):
+        from templateStore import load_thresholds
+        try:
+            matcher.thresholds.update(load_thresholds(self.config["thresholds"]))
+        except (OSError, ValueError, KeyError) as e:
+            self.log(f"無法讀取模板閾值 {self.config['thresholds']}: {e}", level=logging.WARNING)
+            return
+        if matcher.thresholds:
+            self.log(f"已載入 {len(matcher.thresholds)} 個模板的校正閾值，這些模板不受信心度設定影響")
+
+    def _on_scale_change(self, key, scale):
+        self.log(f"模板 [{key}] 在 {self.display} 上的最佳尺度為 {scale:g}，之後只用此尺度比對")
+        if self.config["scale_search"]["store"]:
+            from templateStore import save_scale
+            try:
+                save_scale(self.config["scale_search"]["store"], self.display, key, scale)
+            except OSError as e:
+                self.log(f"無法保存模板尺度: {e}", level=logging.WARNING)
+
+    def set_scale_search(self, enabled):
+        self.matcher.scale_search = enabled
+
+    @property
+    def recorder(self):
+        if self._recorder is None:
+            from frameRecorder import FrameRecorder
+            config = self.config["recorder"]
+            self._recorder = FrameRecorder(config["directory"], config["max_mb"] * 1024 * 1024, config["workers"],
+                                           crop_margin=config["crop_margin"], min_interval=config["min_interval"],
+                                           prefix=self.name)
+        return self._recorder
+
+    @property
+    def snapshot_recorder(self):
+        """手動要求的截圖（例如 GUI 的詳細分析）：不受 recorder.enabled 影響、保存整個畫面，存在 recorder 資料夾下的 snapshots/"""
+        if self._snapshot_recorder is None:
+            from frameRecorder import FrameRecorder
+            config = self.config["recorder"]
+            self._snapshot_recorder = FrameRecorder(os.path.join(config["directory"], "snapshots"),
+                                                    config["max_mb"] * 1024 * 1024, workers=1, crop_margin=None,
+                                                    min_interval=0, prefix=self.name)
+        return self._snapshot_recorder
+
+    def save_snapshot(self, frame, kind, result=None):
+        """非同步保存整個畫面，回傳檔名（不含副檔名）或 None"""
+        return self.snapshot_recorder.record(frame, kind, result, state=self.current_state,
+                                             extra={"channel": self.current_channel})
+
+    def record_frame(self, frame, kind, result=None, min_interval=None):
+        """設定啟用時非同步保存畫面，回傳檔名（不含副檔名）或 None"""
+        if not self.config["recorder"]["enabled"]: return None
+        return self.recorder.record(frame, kind, result, state=self.current_state,
+                                    extra={"channel": self.current_channel}, min_interval=min_interval)
+
+    @property
+    def scene_classifier(self):
+        """設定停用時為 None"""
+        if self._scene_classifier is None and self.config["scenes"]["enabled"]:
+            from sceneClassifier import SceneClassifier
+            config = self.config["scenes"]
+            self._scene_classifier = SceneClassifier(config["store"], config["samples"],
+                                                     min_score=config["min_score"], margin=config["margin"],
+                                                     max_references=config["max_references"],
+                                                     save_interval=config["save_interval"])
+        return self._scene_classifier
+
+    @property
+    def channel_history(self):
+        if self._channel_history is None:
+            from channelTracker import ChannelHistory
+            self._channel_history = ChannelHistory(self.config["channels"]["history"])
+        return self._channel_history
+
+    @property
+    def channel_scheduler(self):
+        if self._channel_scheduler is None:
+            from channelTracker import ChannelScheduler
+            config = self.config["channels"]
+            self._channel_scheduler = ChannelScheduler(self.channel_history, range(1, config["count"] + 1),
+                                                       config["respawn_seconds"], config["min_revisit"])
+        return self._channel_scheduler
+
+    def close(self):
+        self.stop()
+        if self._notifier is not None: self._notifier.close()
+        if self._matcher is not None: self._matcher.capture_backend.close()
+        for exporter in self._exporters: exporter.close()
+        self._exporters = []
+        if self._recorder is not None: self._recorder.close()
+        if self._snapshot_recorder is not None: self._snapshot_recorder.close()
+        if self._scene_classifier is not None: self._scene_classifier.flush()
+
+    def start_exporters(self):
+        """依設定開啟 /metrics 與定期匯出；重複呼叫不會重複開啟"""
+        if self._exporters: return
+        config = self.config["metrics"]
+        if config["port"]:
+            try:
+                self._exporters.append(MetricsServer(self.metrics, config["port"], config["host"]))
+            except OSError as e:
+                self.log(f"無法開啟效能指標 port {config['port']}: {e}", level=logging.WARNING)
+        if config["dump_file"]:
+            self._exporters.append(MetricsDumper(self.metrics, config["dump_file"], config["dump_interval"]))
+        for exporter in self._exporters: exporter.start()
+
+    # --- templates ---
+
+    def load_template(self, key, path, remember=False):
+        """remember=True 時把路徑寫進使用者的模板清單 (user_manifest)，下次啟動自動載入"""
+        if self.matcher.load_template(key, path) is None:
+            self.log(f"錯誤: 無法讀取圖片 {path}")
+            return False
+        self.template_paths[key] = path
+        self.log(f"成功載入灰階模板: {key}")
+        if remember and self.config["user_manifest"]:
+            from templateStore import load_manifest, save_manifest
+            entries = load_manifest(self.config["user_manifest"])
+            entries[key] = path
+            save_manifest(self.config["user_manifest"], entries)
+        return True
+
+    def load_configured_templates(self):
+        """先載入模板清單（使用者清單覆蓋隨附清單），設定檔 templates 中指定的路徑優先"""
+        from templateStore import load_manifests
+        paths = load_manifests(self.config["manifest"], self.config["user_manifest"])
+        paths.update({key: path for key, path in self.config["templates"].items() if path})
+        started = time.perf_counter()
+        for key, path in paths.items():
+            if key in self.templates: self.load_template(key, path)
+        bank = self.config["boss_bank"]
+        if bank and os.path.isdir(bank): self.load_boss_bank(bank)
+        cache = self.matcher.template_cache
+        if cache is not None:
+            self.log("模板載入耗時 %.1f ms (快取命中 %d / 未命中 %d)", (time.perf_counter() - started) * 1000,
+                     cache.hits, cache.misses, level=logging.DEBUG)
+
+    def load_boss_bank(self, directory):
+        keys = self.matcher.load_bank("boss", directory)
+        self.log(f"Boss 圖庫載入 {len(keys)} 個模板: {', '.join(self.boss_name(k) for k in keys)}")
+        self.set_pyramid_levels(self.pyramid_levels)
+        return keys
+
+    def set_pyramid_levels(self, levels):
+        self.pyramid_levels = levels
+        self.matcher.cache_levels = levels
+        for key in ["boss_indicator"] + self.matcher.banks.get("boss", []):
+            self.matcher.set_pyramid(key, levels)
+
+    def set_change_gating(self, enabled):
+        self.matcher.change_gating = enabled
+        self.matcher.change_detector.reset()
+
+    def missing_templates(self):
+        # Boss 指示器與 Boss 圖庫擇一即可
+        missing = [k for k, t in self.templates.items() if t is None and k != "boss_indicator"]
+        if not self.boss_keys(): missing.append("boss_indicator")
+        return missing
+
+    def boss_keys(self):
+        """所有要在同一次掃描中比對的 Boss 模板"""
+        keys = ["boss_indicator"] if self.templates["boss_indicator"] is not None else []
+        return keys + self.matcher.banks.get("boss", [])
+
+    def boss_name(self, key):
+        return "Boss 指示器" if key == "boss_indicator" else key.split("/", 1)[-1]
+
+    def match_bosses(self, frame):
+        """一次比對所有 Boss 模板，回傳 (信心度最高的命中結果或 None, 信心度最高的結果)"""
+        results = self.matcher.match(frame, self.boss_keys()).values()
+        best = max(results, key=lambda r: r.score, default=None)
+        hit = max((r for r in results if r.found), key=lambda r: r.score, default=None)
+        return hit, best
+
+    # --- logging / lifecycle ---
+
+    def log(self, message, *args, level=logging.INFO):
+        """可從任何執行緒呼叫；args 只在該等級啟用時才會格式化"""
+        logger.log(level, message, *args)
+
+    def update_status(self, text):
+        if self.on_status: self.on_status(text)
+        self.log(f"狀態變更 -> {text}")
+
+    def start(self):
+        """在背景執行緒執行主循環（GUI 使用）"""
+        self.is_running = True
+        self.failed = False
+        self.current_state = BotState.DETERMINING_STATE
+        self.start_exporters()
+        self.bot_thread = threading.Thread(target=self.main_loop, daemon=True)
+        self.bot_thread.start()
+
+    def run(self):
+        """在目前執行緒執行主循環直到停止（無介面模式使用）"""
+        self.is_running = True
+        self.failed = False
+        self.current_state = BotState.DETERMINING_STATE
+        self.start_exporters()
+        self.main_loop()
+
+    def stop(self, reason="已手動停止", failed=False):
+        if not self.is_running: return
+        self.is_running = False
+        self.failed = failed
+        self.metrics.inc("stops_total", reason="failed" if failed else "stopped")
+        self.current_state = BotState.STOPPED
+        if self.on_stopped: self.on_stopped(reason)
+        self.update_status(reason)
+
+    # --- detection primitives ---
+
+    def is_image_on_screen(self, template_key, frame=None):
+        if self.templates[template_key] is None: return False
+        # 沒有傳入幀時才自行擷取；同一個 tick 內應共用同一幀
+        if frame is None: frame = self.matcher.capture()
+        return self.matcher.match_one(frame, template_key).found
+
+    def wait_until(self, keys, deadline, present=True, on_miss=None, min_interval=0.05, max_interval=0.5):
+        """輪詢直到 keys 中任一模板出現（present=False 時為全部消失），最多等待 deadline 秒
+
+        畫面有變化（正在載入／切換）時以最短間隔重試，畫面靜止時逐步拉長間隔。
+        回傳 (frame, result)，present=False 時 result 為 None；逾時、停止或模板無法比對時回傳 None。
+        """
+        if isinstance(keys, str): keys = [keys]
+        end_time = self.clock.time() + deadline
+        interval = min_interval
+        while self.is_running:
+            frame = self.matcher.capture()
+            results = self.matcher.match(frame, keys)
+            if not any(r.valid for r in results.values()):
+                self.log(f"錯誤: {keys} 模板未載入或比螢幕大")
+                return None
+            hits = [r for r in results.values() if r.found]
+            if present and hits:
+                hit = max(hits, key=lambda r: r.score)
+                self.learn_scene(frame, hit.key)
+                return frame, hit
+            if not present and not hits: return frame, None
+            if on_miss: on_miss(results)
+
+            remaining = end_time - self.clock.time()
+            if remaining <= 0: return None
+            interval = min_interval if frame.changed_boxes != [] else min(max_interval, interval * 1.5)
+            self.clock.sleep(min(interval, remaining))
+        return None
+
+    def find_and_click(self, template_key, timeout=5, expect=None, gone=False, verify_timeout=None, retries=None,
+                       refind_timeout=0.5):
+        """尋找模板並點擊中心，回傳點擊的螢幕座標；timeout 秒內找不到時回傳 None
+
+        有 expect 時點擊後確認是否生效：expect 中任一模板在 verify_timeout 秒內出現
+        （gone=True 時為全部消失）才算成功，否則重新尋找 template_key 再點一次，最多重試 retries 次。
+        重試時已找不到原本的模板代表畫面已經切換，視為成功；重試完仍未生效時回傳 False。
+        """
+        self.log(f"正在尋找並點擊 [{template_key}]...")
+        retries = self.config["input"]["retries"] if retries is None else retries
+
+        def report(results):
+            # Add debugging info for login / character select buttons
+            if template_key in ("login_button", "char_select_button"):
+                result = results[template_key]
+                self.log("  > 當前最高信心度: %.3f (需要 %.3f)", result.score, result.threshold, level=logging.DEBUG)
+
+        center_pos = None
+        for attempt in range(retries + 1 if expect else 1):
+            hit = self.wait_until([template_key], timeout if center_pos is None else refind_timeout, on_miss=report)
+            if hit is None:
+                if center_pos is None and self.is_running: self.log(f"提示: {timeout}秒內找不到 [{template_key}]")
+                return center_pos
+            frame, result = hit
+            center_pos = frame.to_screen(result.center)
+            self.log(f"  > 找到 [{template_key}] 於 {center_pos}，信心度 {result.score:.2f}，點擊它。")
+            with self.metrics.timer("input_seconds", action="click"):
+                self.input.click(center_pos, label=template_key)
+            # 從擷取到這一幀到點擊完成
+            self.metrics.observe("click_latency_seconds", time.time() - frame.timestamp, template=template_key)
+            if expect is None or self.verify(expect, gone, verify_timeout, action=template_key): return center_pos
+            if not self.is_running: return None
+            self.metrics.inc("input_retries_total", action=template_key)
+            self.log(f"  > 點擊 [{template_key}] 後{'仍有' if gone else '未出現'} {expect}，重試 ({attempt + 1}/{retries})")
+        self.log(f"錯誤: 點擊 [{template_key}] {retries + 1} 次仍沒有反應")
+        return False
+
+    def press(self, key, expect=None, gone=False, verify_timeout=None, retries=None):
+        """按鍵；有 expect 時與 find_and_click 相同方式確認並重試，回傳是否生效"""
+        retries = self.config["input"]["retries"] if retries is None else retries
+        for attempt in range(retries + 1 if expect else 1):
+            with self.metrics.timer("input_seconds", action="press"):
+                self.input.press(key)
+            if expect is None or self.verify(expect, gone, verify_timeout, action=key): return True
+            if not self.is_running: return False
+            self.metrics.inc("input_retries_total", action=key)
+            self.log(f"  > 按下 {key} 後{'仍有' if gone else '未出現'} {expect}，重試 ({attempt + 1}/{retries})")
+        return False
+
+    def verify(self, expect, gone=False, timeout=None, action=None):
+        """等待 expect 模板出現（gone=True 時為消失），回傳是否在 timeout 秒內達成"""
+        timeout = self.config["input"]["verify_timeout"] if timeout is None else timeout
+        started = time.perf_counter()
+        ok = self.wait_until(expect, timeout, present=not gone) is not None
+        self.metrics.observe("verify_seconds", time.perf_counter() - started, action=action,
+                             result="ok" if ok else "timeout")
+        return ok
+
+    def scan_for_boss(self, duration=None):
+        duration = self.scan_duration if duration is None else duration
+        self.log(f"開始掃描 Boss，持續 {duration} 秒...")
+        start_time = self.clock.time()
+        pipeline = self._start_pipeline()
+        try:
+            return self._scan_loop(start_time, duration, pipeline)
+        finally:
+            if pipeline is not None:
+                pipeline.stop()
+                elapsed = self.clock.time() - start_time
+                self.log("掃描管線: 擷取 %d 幀 / 比對 %d 幀 / 丟棄 %d 幀，實際 %.1f FPS", pipeline.captured,
+                         pipeline.consumed, pipeline.dropped, pipeline.consumed / elapsed if elapsed else 0.0,
+                         level=logging.DEBUG)
+
+    def _start_pipeline(self):
+        config = self.config["pipeline"]
+        if not config["enabled"]: return None
+        from frameMatcher import FramePipeline
+        return FramePipeline(self.matcher, fps=config["fps"], ring=config["ring"]).start()
+
+    def _scan_loop(self, start_time, duration, pipeline):
+        scan_count = 0
+        while self.clock.time() - start_time < duration:
+            if not self.is_running: return False
+
+            # 每個 tick 只擷取一次，所有 Boss 模板與調試資訊共用同一幀；管線模式下由背景執行緒按目標幀率擷取
+            frame = pipeline.get(timeout=1.0) if pipeline is not None else self.matcher.capture()
+            if frame is None: continue
+            scan_count += 1
+            if scan_count == 1: self.record_channel_visit(frame)
+            hit, result = self.match_bosses(frame)
+            if hit is not None:
+                self.detected_boss = self.boss_name(hit.key)
+                self.metrics.inc("boss_detections_total", boss=self.detected_boss)
+                if self.current_channel is not None:
+                    self.channel_history.record_sighting(self.current_channel, self.detected_boss)
+                self.log(f"🎉🎉🎉 偵測到 BOSS [{self.detected_boss}]！信心度 {hit.score:.3f} 🎉🎉🎉")
+                self.record_frame(frame, "detection", hit, min_interval=0)
+                self.boss_detected = True  # 設置 Boss 偵測標記
+                # 不停止，繼續運作
+                return False  # 返回 False 讓機器人繼續到下一個狀態
+            else:
+                # 信心度接近但未達到閾值（預設 70%）的畫面交給背景執行緒保存，同一模板有最短間隔
+                near = result.score >= result.threshold * self.config["recorder"]["near_threshold"]
+                if near: self.record_frame(frame, "near_threshold", result)
+                # 每10次掃描顯示一次調試資訊（因為現在掃描更頻繁）
+                if scan_count % 10 == 0:
+                    self.log("掃描中... 第%d次檢查，最高信心度: %.3f [%s] (需要 %.3f)", scan_count, result.score,
+                             self.boss_name(result.key), result.threshold, level=logging.DEBUG)
+                    if near: self.log(f"⚠️ 接近偵測閾值！信心度: {result.score:.3f}")
+
+            if pipeline is None: self.clock.sleep(self.scan_interval)  # 更頻繁的檢查
+
+        self.log("掃描結束，未發現 Boss。")
+        return False
+
+    # --- channels ---
+
+    def read_channel(self, frame):
+        """以 OCR 讀取目前頻道；未設定 ocr_roi、辨識不出或沒有安裝 tesseract 時回傳 None"""
+        config = self.config["channels"]
+        if not config["ocr_roi"] or self._channel_reader is False: return None
+        if self._channel_reader is None:
+            from channelTracker import ChannelReader
+            self._channel_reader = ChannelReader(config["ocr_roi"], config["tesseract_cmd"])
+        try:
+            with self.metrics.timer("ocr_seconds"):
+                return self._channel_reader.read(frame)
+        except (ImportError, OSError, RuntimeError) as e:
+            # pytesseract 未安裝、找不到 tesseract 執行檔或執行失敗（TesseractError，例如缺少語言資料），之後不再嘗試
+            self.log(f"無法使用 OCR 讀取頻道，已停用頻道追蹤: {e}", level=logging.WARNING)
+            self._channel_reader = False
+            return None
+
+    def record_channel_visit(self, frame):
+        """記錄這次掃描的頻道：以 OCR 為準，沒有 OCR 時使用換頻時點選的頻道，否則排程永遠只看到空的紀錄"""
+        channel = self.read_channel(frame)
+        if channel is None: channel = self._selected_channel
+        self._selected_channel = None
+        if channel is None: return
+        if channel != self.current_channel: self.log(f"目前頻道: {channel}")
+        self.current_channel = channel
+        self.channel_history.record_visit(channel)
+
+    def select_next_channel(self):
+        """在頻道列表上點選紀錄中最可能有 Boss 的頻道，回傳頻道編號
+
+        未設定 list_layout / count，或所有頻道都剛看過時回傳 None，交給遊戲的換頻按鈕決定。
+        只支援頻道列表的第一頁。
+        """
+        config = self.config["channels"]
+        layout = config["list_layout"]
+        if not config["count"] or not layout: return None
+        target = self.channel_scheduler.pick(self.current_channel)
+        if target is None: return None
+        column, row = (target - 1) % layout["columns"], (target - 1) // layout["columns"]
+        pos = (layout["first"][0] + column * layout["step"][0], layout["first"][1] + row * layout["step"][1])
+        self.log(f"選擇頻道 {target} (分數 {self.channel_scheduler.score(target):.2f})，點擊 {pos}")
+        with self.metrics.timer("input_seconds", action="click"):
+            self.input.click(pos, label="channel")
+        return target
+
+    # --- scenes ---
+
+    def classify_scene(self, frame):
+        """回傳目前畫面的場景名稱，無法判斷時回傳 None
+
+        先以縮圖特徵一次比對所有場景；結果不明確時，依特徵分數的順序在同一幀上以模板確認，
+        特徵沒見過的場景排在最後。遊戲中沒有可確認的模板，只有在特徵分數達到 exclusion_score、
+        且其他候選都被模板排除時才判定為遊戲中。
+        """
+        classifier = self.scene_classifier
+        candidates = []
+        if classifier is not None:
+            with self.metrics.timer("scene_classify_seconds"):
+                scene, candidates = classifier.classify(frame)
+            if scene is not None:
+                self.metrics.inc("scenes_total", scene=scene, method="signature")
+                return scene
+        order = candidates + [s for s in SCENE_INDICATORS if s not in candidates]
+        with self.metrics.timer("scene_confirm_seconds"):
+            for scene in order:
+                key = SCENE_INDICATORS[scene]
+                if key is not None and self.is_image_on_screen(key, frame):
+                    self.learn_scene(frame, key)
+                    self.metrics.inc("scenes_total", scene=scene, method="template")
+                    return scene
+        # 載入畫面等陌生畫面也可能勉強像遊戲中，排除法只在縮圖本身也夠像時成立
+        if "in_game" in candidates and classifier.scores(frame)["in_game"] >= self.config["scenes"]["exclusion_score"]:
+            self.metrics.inc("scenes_total", scene="in_game", method="exclusion")
+            return "in_game"
+        return None
+
+    def learn_scene(self, frame, template_key):
+        """模板確認了某個場景時，把這一幀加入場景辨識的參考"""
+        classifier = self.scene_classifier
+        if classifier is None: return
+        for scene, key in SCENE_INDICATORS.items():
+            if key == template_key and classifier.learn(scene, frame):
+                self.log(f"場景辨識: 新增 [{SCENE_NAMES[scene]}] 參考畫面", level=logging.DEBUG)
+
+    # --- state machine ---
+
+    def determine_initial_state(self):
+        """判斷目前場景並回傳要接續的狀態；可從遊戲中、ESC 選單、頻道列表直接接續，不必重新登入"""
+        self.log("正在判斷當前遊戲場景...")
+
+        # 場景一出現就立即判斷，最多等待 determine_state 秒給遊戲載入
+        deadline = self.deadlines["determine_state"]
+        end_time = self.clock.time() + deadline
+        interval = 0.05
+        while self.is_running:
+            frame = self.matcher.capture()
+            scene = self.classify_scene(frame)
+            if scene is not None:
+                self.log(f"判斷結果: 位於{SCENE_NAMES[scene]}。")
+                self._menu_open = scene == "esc_menu"
+                return SCENE_STATES[scene]
+            remaining = end_time - self.clock.time()
+            if remaining <= 0: break
+            interval = 0.05 if frame.changed_boxes != [] else min(0.5, interval * 1.5)
+            self.clock.sleep(min(interval, remaining))
+        if not self.is_running: return BotState.STOPPED
+
+        # 如果仍無法識別，回到登入畫面重新開始
+        self.log(f"{deadline}秒內仍無法識別場景，回到登入畫面重新開始...")
+        return BotState.LOGIN_SCREEN
+
+    def _record_state(self):
+        """狀態改變時記錄上一個狀態的停留時間；每次回到掃描狀態算完成一輪換頻"""
+        now = time.perf_counter()
+        if self._state_entered is not None:
+            previous, entered = self._state_entered
+            if previous == self.current_state: return
+            self.metrics.observe("state_seconds", now - entered, state=previous)
+        if self.current_state == BotState.IN_GAME_SCANNING:
+            if self._cycle_started is not None:
+                self.metrics.observe("channel_cycle_seconds", now - self._cycle_started)
+                self.metrics.inc("channel_cycles_total")
+            self._cycle_started = now
+        self._state_entered = (self.current_state, now)
+
+    def main_loop(self):
+        self._state_entered = self._cycle_started = None
+        while self.is_running:
+            self._record_state()
+            self.update_status(self.current_state)
+
+            if self.current_state == BotState.DETERMINING_STATE:
+                self.current_state = self.determine_initial_state()
+                if self.current_state == BotState.STOPPED: self.stop()
+            elif self.current_state == BotState.LOGIN_SCREEN:
+                if not self.is_image_on_screen("login_scene_indicator"):
+                    self.log("錯誤: 登入畫面的指示器消失了，重新判斷場景。")
+                    self.current_state = BotState.DETERMINING_STATE
+                    continue
+                self.log("場景已確認，等待登入按鈕出現...")
+                clicked = self.find_and_click("login_button", timeout=self.deadlines["login_button"],
+                                              expect="char_select_scene_indicator",
+                                              verify_timeout=self.deadlines["after_login"])
+                if clicked is None:
+                    self.stop("找不到登入按鈕，已停止", failed=True)
+                    continue
+                if clicked: self.log("點擊登入按鈕成功，已進入角色選擇畫面。")
+                self.current_state = BotState.DETERMINING_STATE
+            elif self.current_state == BotState.CHAR_SELECT:
+                self.log("進入角色選擇狀態，確認畫面已載入...")
+
+                # 先確認我們還在角色選擇畫面
+                if self.wait_until(["char_select_scene_indicator"], self.deadlines["char_select_loaded"]) is None:
+                    self.log("錯誤: 角色選擇畫面的指示器消失了，重新判斷場景。")
+                    self.current_state = BotState.DETERMINING_STATE
+                    continue
+
+                if self.find_and_click("char_select_button", timeout=3, expect="char_select_scene_indicator", gone=True):
+                    self.log("點擊角色選擇成功，立即開始掃描 Boss...")
+                    self.current_state = BotState.IN_GAME_SCANNING
+                else:
+                    self.log("找不到角色選擇按鈕，重新判斷場景...")
+                    self.current_state = BotState.DETERMINING_STATE
+            elif self.current_state == BotState.IN_GAME_SCANNING:
+                if self.scan_for_boss():
+                    self.log("偵測到 Boss，但繼續運作...")
+                    # 繼續到下一個狀態而不是停止
+                    self.current_state = BotState.OPENING_CHANNEL_LIST
+                else:
+                    self.current_state = BotState.OPENING_CHANNEL_LIST
+            elif self.current_state == BotState.OPENING_CHANNEL_LIST:
+                if not self._menu_open:
+                    # 掃描了 scan_duration 秒，遊戲畫面已載入完成，作為場景辨識的遊戲中參考
+                    if self.scene_classifier is not None:
+                        self.scene_classifier.learn("in_game", self.matcher.capture())
+                    # ESC 會開關選單，重按可能把剛開的選單關掉；沒看到選單就交給場景辨識重新判斷
+                    if not self.press('esc', expect="menu_channel_button", retries=0):
+                        self.log("按下 ESC 後沒有出現頻道按鈕，重新判斷場景...")
+                        self.current_state = BotState.DETERMINING_STATE
+                        continue
+                self._menu_open = False
+                if self.find_and_click("menu_channel_button", timeout=self.deadlines["channel_menu"],
+                                       expect="switch_channel_button", verify_timeout=self.deadlines["channel_list"]):
+                    self.current_state = BotState.SWITCHING_CHANNEL
+                else:
+                    self.log("無法從ESC選單開啟頻道列表，重新判斷場景...")
+                    self.current_state = BotState.DETERMINING_STATE
+            elif self.current_state == BotState.SWITCHING_CHANNEL:
+                # 如果偵測到 Boss，擷取頻道切換畫面交給背景執行緒發送，不等待網路
+                if self.boss_detected:
+                    self.log("偵測到 Boss，擷取頻道切換畫面並排入 Discord 通知...")
+                    frame = self.matcher.capture(keep_color=True)
+                    prefix = f"[{self.name}] " if self.name else ""
+                    channel = f" 頻道 {self.current_channel}" if self.current_channel is not None else ""
+                    self.notifier.notify(f"{prefix}🎉🎉🎉 偵測到 BOSS [{self.detected_boss}]{channel}！ 🎉🎉🎉", image=frame.rgb)
+                    self.boss_detected = False  # 重置標記
+
+                target = self.select_next_channel()
+                if not self.find_and_click("switch_channel_button", expect="confirm_button",
+                                           verify_timeout=self.deadlines["confirm_button"]):
+                    self.stop("找不到換頻按鈕，已停止", failed=True); continue
+                if not self.find_and_click("confirm_button", timeout=self.deadlines["confirm_button"],
+                                           expect="confirm_button", gone=True):
+                    self.stop("找不到確認換頻按鈕，已停止", failed=True); continue
+                self._selected_channel = target
+                self.log(f"頻道切換中，等待遊戲重新載入（最多{self.deadlines['channel_switch']}秒）...")
+                self.wait_until(["login_scene_indicator", "char_select_scene_indicator"], self.deadlines["channel_switch"])
+                self.log("頻道切換完成，重新判斷遊戲場景...")
+                self.current_state = BotState.DETERMINING_STATE
+        self._record_state()
+        self.log("主循環已結束。")
@@ -0,0 +1,63 @@
+import collections
+import logging
+import os
+import logging.handlers
+
+LOGGER_NAME = "bossHunter"
+logger = logging.getLogger(LOGGER_NAME)
+
+LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+
+
+class RingBufferHandler(logging.Handler):
+    """將日誌放進有上限的環狀緩衝區，由 GUI 執行緒定時批次取出
+
+    任何執行緒都可以寫入；deque 的 append / popleft 本身是執行緒安全的，
+    GUI 沒有取出時最舊的紀錄會被丟棄，記憶體用量固定。
+    """
+
+    def __init__(self, capacity=2000):
+        super().__init__()
+        self.capacity = capacity
+        self._pending = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._pending.append(line)
+
+    def drain(self, limit=500):
+        lines = []
+        while self._pending and len(lines) < limit:
+            lines.append(self._pending.popleft())
+        return lines
+
+
+def setup_logging(level=logging.INFO, log_file=None, max_bytes=5 * 1024 * 1024, backups=3, capacity=2000, console=False, tag=None):
+    """設定 bossHunter logger，回傳供 GUI 讀取的 RingBufferHandler；log_file 會自動輪替，console 輸出到 stderr
+
+    tag 會加在檔案與 console 每行訊息前（多開模式用來區分視窗）。
+    """
+    prefix = f"[{tag}] " if tag else ""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger.setLevel(level)
+    logger.propagate = False
+
+    ring = RingBufferHandler(capacity)
+    ring.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
+    logger.addHandler(ring)
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s [%(threadName)s] {prefix}%(message)s"))
+        logger.addHandler(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s {prefix}%(message)s"))
+        logger.addHandler(stream_handler)
+    return ring
@@ -0,0 +1,240 @@
+import bisect
+import csv
+import http.server
+import json
+import os
+import threading
+import time
+from botLogging import logger
+
+# 直方圖的桶上限（秒），與 Prometheus 的 le 標籤相同；最後一桶為 +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PREFIX = "bosshunter_"
+
+
+class Histogram:
+    """固定分桶的累計直方圖；百分位數以桶內線性內插估計"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max: self.max = value
+
+    def quantile(self, q):
+        if not self.count: return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.bounds[i - 1] if i else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99), "max": self.max}
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics, self.name, self.labels = metrics, name, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Metrics:
+    """延遲直方圖與計數器；任何執行緒都可以寫入，匯出時取快照
+
+    名稱不含前綴與單位以外的資訊，維度放在 labels，例如
+    observe("match_seconds", 0.004, template="login_button", mode="full")。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}    # (name, labels) -> float
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def timer(self, name, **labels):
+        """with metrics.timer("capture_seconds"): ..."""
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """回傳 (histograms, counters)：[(name, labels dict, summary dict)], [(name, labels dict, value)]"""
+        with self._lock:
+            histograms = [(name, dict(labels), h.summary()) for (name, labels), h in sorted(self._histograms.items())]
+            counters = [(name, dict(labels), value) for (name, labels), value in sorted(self._counters.items())]
+        return histograms, counters
+
+    def prometheus_text(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted((k, list(h.counts), h.sum, h.count) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), counts, total, count in histograms:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, n in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def rows(self):
+        """匯出用的扁平資料列（累計值，自啟動或 reset 起算）"""
+        now = time.time()
+        histograms, counters = self.snapshot()
+        rows = [dict(time=now, metric=name, labels=labels, **summary) for name, labels, summary in histograms]
+        rows += [dict(time=now, metric=name, labels=labels, value=value) for name, labels, value in counters]
+        return rows
+
+
+def _labels(labels):
+    if not labels: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class MetricsServer:
+    """在背景執行緒提供 http://host:port/metrics (Prometheus 格式)"""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        metrics_ref = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics_ref.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.info("效能指標: http://%s:%d/metrics", *self.server.server_address[:2])
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsDumper:
+    """每 interval 秒把累計指標附加到 JSONL 或 CSV 檔"""
+    CSV_FIELDS = ["time", "metric", "labels", "count", "sum", "mean", "p50", "p90", "p99", "max", "value"]
+
+    def __init__(self, metrics, path, interval=60, fmt=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.format = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self.thread.is_alive(): self.thread.join(timeout=5)
+        self.dump()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        rows = self.metrics.rows()
+        if not rows: return
+        try:
+            if self.format == "csv":
+                new_file = not os.path.exists(self.path)
+                with open(self.path, "a", newline="", encoding="utf-8") as f:
+                    writer = csv.DictWriter(f, self.CSV_FIELDS)
+                    if new_file: writer.writeheader()
+                    for row in rows:
+                        row = dict(row, labels=";".join(f"{k}={v}" for k, v in row["labels"].items()))
+                        writer.writerow(row)
+            else:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("無法寫入效能指標 %s: %s", self.path, e)
+
+
+def format_summary(metrics, limit=12):
+    """GUI / 日誌用的簡短文字摘要，依總耗時排序"""
+    histograms, counters = metrics.snapshot()
+    histograms.sort(key=lambda row: row[2]["sum"], reverse=True)
+    lines = []
+    for name, labels, s in histograms[:limit]:
+        label = ",".join(str(v) for v in labels.values())
+        title = f"{name}[{label}]" if label else name
+        lines.append(f"{title:<40} n={s['count']:<6} p50={s['p50'] * 1000:7.1f}ms p90={s['p90'] * 1000:7.1f}ms "
+                     f"max={s['max'] * 1000:7.1f}ms")
+    for name, labels, value in counters:
+        label = ",".join(str(v) for v in labels.values())
+        lines.append(f"{name}[{label}] = {value:g}" if label else f"{name} = {value:g}")
+    return "\n".join(lines)
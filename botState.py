@@ -0,0 +1,34 @@
+# Using the previous scene-aware state machine
+class BotState:
+    DETERMINING_STATE = "DETERMINING_STATE"
+    LOGIN_SCREEN = "LOGIN_SCREEN"
+    CHAR_SELECT = "CHAR_SELECT"
+    IN_GAME_SCANNING = "IN_GAME_SCANNING"
+    OPENING_CHANNEL_LIST = "OPENING_CHANNEL_LIST"
+    SWITCHING_CHANNEL = "SWITCHING_CHANNEL"
+    STOPPED = "STOPPED"
+
+
+# 所有狀態用到的模板，GUI 與離線工具共用
+TEMPLATE_KEYS = [
+    "login_scene_indicator", "char_select_scene_indicator",
+    "login_button", "char_select_button", "boss_indicator",
+    "menu_channel_button", "switch_channel_button", "confirm_button",
+]
+
+# 場景辨識 (sceneClassifier.py) 的場景 -> 可在同一幀上確認該場景的模板；遊戲中沒有固定的畫面元素，只靠縮圖特徵
+SCENE_INDICATORS = {
+    "login": "login_scene_indicator", "char_select": "char_select_scene_indicator",
+    "esc_menu": "menu_channel_button", "channel_list": "switch_channel_button", "in_game": None,
+}
+
+# 從辨識出的場景接續主循環
+SCENE_STATES = {
+    "login": BotState.LOGIN_SCREEN, "char_select": BotState.CHAR_SELECT, "in_game": BotState.IN_GAME_SCANNING,
+    "esc_menu": BotState.OPENING_CHANNEL_LIST, "channel_list": BotState.SWITCHING_CHANNEL,
+}
+
+SCENE_NAMES = {
+    "login": "登入畫面", "char_select": "角色選擇畫面", "in_game": "遊戲中",
+    "esc_menu": "ESC 選單", "channel_list": "頻道列表",
+}
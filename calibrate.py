@@ -0,0 +1,241 @@
+"""以標註過的畫面校正各模板的閾值，並比較各種比對模式相對於完整比對損失多少準確度
+
+用法:
+    python calibrate.py recordings/ --labels labels.json
+    python calibrate.py recordings/ --templates templates/ --boss-bank static/boss --labels labels.json --write static/thresholds.json
+
+標註格式與 benchmark.py 相同: {"<檔名或幀編號>": ["login_button", "boss/fox2", ...]}；frameRecorder 保存的
+.json 加上 "labels": [...] 也會一併讀入。只有標註過的幀列入統計，標註中沒有列出的模板視為不在畫面上。
+
+每個模板以完整比對 (exact) 的分數決定閾值：出現時的最低分高於未出現時的最高分，就取兩者中點，
+margin 為間距的一半；分數重疊時選擇誤報加權 (--fp-weight) 後錯誤最少的閾值，margin 為負值。
+沒有 --templates 時依設定檔 (--config) 的模板清單與 Boss 圖庫載入模板。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from benchmark import load_templates, percentiles
+from botConfig import load_config
+from botState import TEMPLATE_KEYS
+from frameMatcher import FrameMatcher
+from screenCapture import ReplayCapture, ReplayFinished
+from templateStore import load_manifests, save_thresholds
+
+# 名稱 -> (金字塔層數, 沿用上次位置 (ROI), 畫面變化閘門)；exact 為基準
+MODES = {
+    "exact": (0, False, False),
+    "roi": (0, True, False),
+    "gating": (0, False, True),
+    "pyramid1": (1, False, False),
+    "pyramid2": (2, False, False),
+    "default": (2, True, True),
+}
+
+
+def load_labels(args):
+    labels = {}
+    if os.path.isdir(args.source):
+        # frameRecorder 的說明檔：<名稱>.png 旁的 <名稱>.json
+        for filename in sorted(os.listdir(args.source)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in ReplayCapture.IMAGE_EXTENSIONS: continue
+            sidecar = os.path.join(args.source, stem + ".json")
+            if not os.path.isfile(sidecar): continue
+            with open(sidecar, encoding="utf-8") as f:
+                metadata = json.load(f)
+            if "labels" in metadata: labels[filename] = set(metadata["labels"])
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels.update({str(k): set(v) for k, v in json.load(f).items()})
+    return labels
+
+
+def load_corpus_templates(args):
+    """回傳 (templates, Boss 圖庫資料夾, 全域信心度)"""
+    if args.templates:
+        return load_templates(args.templates), args.boss_bank, args.threshold or 0.8
+    config = load_config(args.config)
+    paths = load_manifests(config["manifest"], config["user_manifest"])
+    paths.update({key: path for key, path in config["templates"].items() if path})
+    templates = {key: None for key in TEMPLATE_KEYS}
+    for key, path in paths.items():
+        if key in templates: templates[key] = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    return templates, args.boss_bank or config["boss_bank"], args.threshold or config["confidence"]
+
+
+def run_mode(args, templates, bank, threshold, thresholds, mode, labels):
+    """以指定模式重播整段畫面，回傳 ({標註幀名稱: {key: score}}, 每幀比對耗時)
+
+    ROI 與變化閘門依賴前後幀，所以每個模式都從頭依序重播，但只記錄標註過的幀。
+    """
+    levels, use_roi, gating = MODES[mode]
+    capture = ReplayCapture(args.source)
+    matcher = FrameMatcher(dict(templates), lambda: threshold, capture=capture)
+    matcher.thresholds.update(thresholds)
+    matcher.change_gating = gating
+    matcher.scale_search = args.scale_search
+    keys = [k for k in TEMPLATE_KEYS if templates[k] is not None]
+    if bank and os.path.isdir(bank): keys += matcher.load_bank("boss", bank)
+    for key in keys:
+        matcher.set_pyramid(key, levels)
+
+    scores, times = {}, []
+    try:
+        while args.max_frames is None or len(times) < args.max_frames:
+            try:
+                frame = matcher.capture()
+            except ReplayFinished:
+                break
+            if not use_roi: matcher.learned_rois.clear()
+            started = time.perf_counter()
+            results = matcher.match(frame, keys)
+            times.append(time.perf_counter() - started)
+            if capture.current_name in labels:
+                scores[capture.current_name] = {key: r.score for key, r in results.items() if r.valid}
+    finally:
+        capture.close()
+    return scores, times
+
+
+def choose_threshold(positives, negatives, fp_weight, default_margin, floor, ceiling):
+    """回傳 (threshold, margin)；margin 為 None 代表沒有負例可參考"""
+    low = min(positives)
+    if not negatives:
+        return min(ceiling, max(floor, low - default_margin)), None
+    high = max(negatives)
+    margin = (low - high) / 2
+    if low > high:
+        threshold = (low + high) / 2
+    else:
+        pos, neg = np.sort(positives), np.sort(negatives)
+        candidates = np.unique(np.concatenate([pos, neg + 1e-4]))
+        # 分數 >= threshold 視為找到：誤報 = 負例中 >= threshold 的數量，漏報 = 正例中 < threshold 的數量
+        false_positives = len(neg) - np.searchsorted(neg, candidates, side="left")
+        misses = np.searchsorted(pos, candidates, side="left")
+        cost = fp_weight * false_positives + misses
+        # 成本相同時取較高的閾值
+        threshold = float(candidates[len(cost) - 1 - np.argmin(cost[::-1])])
+    return min(ceiling, max(floor, threshold)), margin
+
+
+def calibrate(scores, labels, args):
+    table, skipped = {}, {}
+    keys = sorted({key for row in scores.values() for key in row})
+    for key in keys:
+        positives = [row[key] for name, row in scores.items() if key in row and key in labels[name]]
+        negatives = [row[key] for name, row in scores.items() if key in row and key not in labels[name]]
+        if len(positives) < args.min_positives:
+            skipped[key] = len(positives)
+            continue
+        threshold, margin = choose_threshold(positives, negatives, args.fp_weight, args.default_margin,
+                                             args.floor, args.ceiling)
+        table[key] = {
+            "threshold": round(threshold, 4), "margin": None if margin is None else round(margin, 4),
+            "positives": len(positives), "negatives": len(negatives),
+            "min_positive": round(min(positives), 4), "max_negative": round(max(negatives), 4) if negatives else None,
+        }
+    return table, skipped
+
+
+def evaluate(scores, exact, labels, thresholds, default):
+    """依校正後的閾值統計命中率，並與完整比對的分數和判斷比較"""
+    counts = {"tp": 0, "fp": 0, "fn": 0, "tn": 0}
+    errors, flips = [], 0
+    for name, row in scores.items():
+        for key, score in row.items():
+            threshold = thresholds.get(key, default)
+            found = score >= threshold
+            counts[("tp" if found else "fn") if key in labels[name] else ("fp" if found else "tn")] += 1
+            reference = exact.get(name, {}).get(key)
+            if reference is None: continue
+            errors.append(abs(score - reference))
+            flips += found != (reference >= threshold)
+    tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+    return dict(counts, precision=tp / (tp + fp) if tp + fp else float("nan"),
+                recall=tp / (tp + fn) if tp + fn else float("nan"), flips=flips,
+                score_error_mean=float(np.mean(errors)) if errors else 0.0,
+                score_error_max=float(np.max(errors)) if errors else 0.0)
+
+
+def run(args):
+    labels = load_labels(args)
+    if not labels: raise SystemExit("沒有任何標註過的幀，請以 --labels 指定標註檔")
+    templates, bank, threshold = load_corpus_templates(args)
+
+    exact, exact_times = run_mode(args, templates, bank, threshold, {}, "exact", labels)
+    table, skipped = calibrate(exact, labels, args)
+    thresholds = {key: entry["threshold"] for key, entry in table.items()}
+
+    modes = {}
+    for mode in args.modes:
+        scores, times = (exact, exact_times) if mode == "exact" else \
+            run_mode(args, templates, bank, threshold, thresholds, mode, labels)
+        modes[mode] = {"match_ms": percentiles(times), **evaluate(scores, exact, labels, thresholds, threshold)}
+        modes[mode]["global"] = evaluate(scores, exact, labels, {}, threshold)
+    return {
+        "source": args.source, "labelled_frames": len(exact), "global_threshold": threshold,
+        "thresholds": table, "skipped": skipped, "modes": modes,
+    }
+
+
+def print_report(report):
+    print(f"來源: {report['source']}  標註幀數: {report['labelled_frames']}  全域信心度: {report['global_threshold']}")
+    print("各模板閾值:")
+    for key, e in sorted(report["thresholds"].items()):
+        margin = "   n/a" if e["margin"] is None else f"{e['margin']:+.3f}"
+        high = "  n/a" if e["max_negative"] is None else f"{e['max_negative']:.3f}"
+        warning = "  ⚠ 分數重疊" if e["margin"] is not None and e["margin"] < 0 else ""
+        print(f"  {key:<28} 閾值={e['threshold']:.3f} margin={margin} 出現最低={e['min_positive']:.3f} "
+              f"未出現最高={high} (正例 {e['positives']} / 負例 {e['negatives']}){warning}")
+    for key, n in sorted(report["skipped"].items()):
+        print(f"  {key:<28} 正例只有 {n} 個，未校正")
+
+    modes = report["modes"]
+    base = modes.get("exact", {}).get("match_ms", {}).get("mean")
+    print("比對模式 (校正後閾值 / 全域信心度):")
+    for mode, m in modes.items():
+        mean = m["match_ms"].get("mean", 0.0)
+        speedup = f"{base / mean:5.1f}x" if base and mean else "   - "
+        g = m["global"]
+        print(f"  {mode:<9} {mean:7.2f} ms {speedup}  precision={m['precision']:.3f} recall={m['recall']:.3f} "
+              f"FP={m['fp']:<4} FN={m['fn']:<4} 判斷改變={m['flips']:<4} 分數誤差 平均={m['score_error_mean']:.4f} "
+              f"最大={m['score_error_max']:.4f} | 全域 precision={g['precision']:.3f} recall={g['recall']:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="依標註畫面校正各模板閾值，並比較各比對模式的準確度")
+    parser.add_argument("source", help="圖片資料夾或影片檔（例如 frameRecorder 的 recordings/）")
+    parser.add_argument("--labels", help="每幀應出現的模板標註 (JSON)，格式同 benchmark.py")
+    parser.add_argument("--config", help="JSON 設定檔；沒有 --templates 時由此載入模板清單與 Boss 圖庫")
+    parser.add_argument("--templates", help="模板資料夾，檔名需與模板 key 相同 (例如 login_button.png)")
+    parser.add_argument("--boss-bank", help="Boss 圖庫資料夾 (例如 static/boss)")
+    parser.add_argument("--threshold", type=float, help="未校正模板使用的全域信心度，預設取設定檔")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--scale-search", action="store_true", help="錄製畫面與模板解析度不同時自動搜尋模板尺度")
+    parser.add_argument("--fp-weight", type=float, default=5.0, help="分數重疊時一次誤報相當於幾次漏報")
+    parser.add_argument("--default-margin", type=float, default=0.05, help="沒有負例時，閾值比正例最低分低多少")
+    parser.add_argument("--min-positives", type=int, default=3, help="正例少於此數的模板不校正")
+    parser.add_argument("--floor", type=float, default=0.5)
+    parser.add_argument("--ceiling", type=float, default=0.99)
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--write", help="將閾值寫入此檔（例如 static/thresholds.json），其他模板的結果保留")
+    parser.add_argument("--json", help="將完整結果寫入 JSON 檔")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.write and report["thresholds"]:
+        save_thresholds(args.write, report["thresholds"])
+        print(f"已寫入 {len(report['thresholds'])} 個模板的閾值: {args.write}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["thresholds"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import time
+import cv2
+import numpy as np
+from botLogging import logger
+
+
+class ChannelReader:
+    """以 OCR 讀取畫面固定區域上的頻道編號
+
+    roi 為視窗內的 (x, y, w, h)。同一區域的像素沒有變化時直接回傳上一次的結果，
+    只有頻道顯示真的改變（換頻、載入）時才呼叫 tesseract。pytesseract 在第一次辨識時才載入。
+    """
+
+    def __init__(self, roi, tesseract_cmd=None, tolerance=8, upscale=3):
+        self.roi = tuple(roi)
+        self.tesseract_cmd = tesseract_cmd
+        self.tolerance = tolerance
+        self.upscale = upscale
+        self.ocr_calls = 0
+        self._last_crop = None
+        self._last_value = None
+        self._tesseract = None
+
+    def read(self, frame):
+        """回傳頻道編號 (int)；區域超出畫面或辨識不出數字時回傳 None"""
+        x, y, w, h = self.roi
+        if x + w > frame.width or y + h > frame.height: return None
+        crop = frame.gray[y:y + h, x:x + w]
+        if self._last_crop is not None and cv2.absdiff(crop, self._last_crop).max() <= self.tolerance:
+            return self._last_value
+        self._last_crop = crop.copy()
+        self._last_value = self._ocr(crop)
+        return self._last_value
+
+    def reset(self):
+        self._last_crop = self._last_value = None
+
+    def _ocr(self, crop):
+        if self._tesseract is None:
+            import pytesseract
+            if self.tesseract_cmd: pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+            self._tesseract = pytesseract
+        image = cv2.resize(crop, None, fx=self.upscale, fy=self.upscale, interpolation=cv2.INTER_CUBIC)
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # tesseract 以白底黑字辨識最準，亮字暗底時反轉
+        if np.count_nonzero(binary) < binary.size // 2: binary = cv2.bitwise_not(binary)
+        self.ocr_calls += 1
+        text = self._tesseract.image_to_string(binary, config="--psm 7 -c tessedit_char_whitelist=0123456789")
+        match = re.search(r"\d+", text)
+        return int(match.group()) if match else None
+
+
+class ChannelHistory:
+    """每個頻道的造訪時間與 Boss 出現紀錄，存成 JSON，重新啟動後沿用"""
+
+    def __init__(self, path=None, max_sightings=50):
+        self.path = path
+        self.max_sightings = max_sightings
+        self.channels = {}  # channel -> {"visits", "last_visit", "sightings": [[time, boss], ...]}
+        if path and os.path.isfile(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.channels = {int(k): v for k, v in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                logger.warning("無法讀取頻道紀錄 %s: %s", path, e)
+
+    def entry(self, channel):
+        return self.channels.setdefault(channel, {"visits": 0, "last_visit": None, "sightings": []})
+
+    def record_visit(self, channel, when=None):
+        entry = self.entry(channel)
+        entry["visits"] += 1
+        entry["last_visit"] = time.time() if when is None else when
+        self.save()
+
+    def record_sighting(self, channel, boss, when=None):
+        sightings = self.entry(channel)["sightings"]
+        sightings.append([time.time() if when is None else when, boss])
+        del sightings[:-self.max_sightings]
+        self.save()
+
+    def save(self):
+        if not self.path: return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({str(k): v for k, v in sorted(self.channels.items())}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("無法保存頻道紀錄 %s: %s", self.path, e)
+
+
+class ChannelScheduler:
+    """依造訪與 Boss 出現紀錄挑出下一個最可能有 Boss 的頻道
+
+    分數 = 上次查看後已經過的時間佔重生時間的比例（越久沒看越可能已重生，從未看過視為 1），
+    再乘上該頻道的歷史出現率 (Laplace 平滑)；上次出現後還不到重生時間的頻道大幅降低分數，
+    min_revisit 秒內看過的頻道與目前頻道不列入考慮。
+    """
+
+    def __init__(self, history, channels, respawn_seconds=1800, min_revisit=120):
+        self.history = history
+        self.channels = list(channels)
+        self.respawn_seconds = respawn_seconds
+        self.min_revisit = min_revisit
+
+    def score(self, channel, now=None):
+        now = time.time() if now is None else now
+        entry = self.history.channels.get(channel) or {"visits": 0, "last_visit": None, "sightings": []}
+        freshness = 1.0
+        if entry["last_visit"] is not None:
+            since_visit = now - entry["last_visit"]
+            if since_visit < self.min_revisit: return 0.0
+            freshness = min(1.0, since_visit / self.respawn_seconds)
+        # 平均每次造訪看到 Boss 的機率，造訪次數少時接近 1/2
+        rate = (len(entry["sightings"]) + 1) / (entry["visits"] + 2)
+        score = freshness * (1.0 + rate)
+        if entry["sightings"] and now - entry["sightings"][-1][0] < self.respawn_seconds * 0.8:
+            score *= 0.25  # 剛出現過，多半已被打掉還沒重生
+        return score
+
+    def pick(self, current=None, now=None):
+        """回傳分數最高的頻道；所有頻道都剛看過時回傳 None，交給遊戲的換頻按鈕決定"""
+        candidates = [(self.score(ch, now), -ch, ch) for ch in self.channels if ch != current]
+        best = max(candidates, default=None)
+        if best is None or best[0] <= 0.0: return None
+        return best[2]
@@ -0,0 +1,644 @@
+import collections
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from screenCapture import create_capture
+
+# 常見的 Windows 顯示縮放 (100%~200%) 與視窗大小差異
+DEFAULT_SCALES = (0.5, 0.67, 0.75, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 1.75, 2.0)
+
+
+def find_peaks(scores, k=5, radius=(1, 1), min_score=None):
+    """從 matchTemplate 結果找出最多 k 個互不重疊的峰值，回傳 [(score, (x, y)), ...]，分數由高到低
+
+    radius 為 (rx, ry)：與已選峰值 |dx| < rx 且 |dy| < ry 的位置視為同一個峰值的鄰近像素而略過。
+    先以 argpartition 取出分數最高的一小批位置（不排序整張結果），在其中依序做非極大值抑制；
+    候選全被少數寬峰的鄰近像素佔滿時，才改用遮罩 + minMaxLoc 逐一找出剩下的峰值。
+    """
+    flat = scores.ravel()
+    if k <= 0 or flat.size == 0: return []
+    width = scores.shape[1]
+    rx, ry = radius
+    pool = min(flat.size, max(256, k * 64))
+    indices = np.argpartition(flat, flat.size - pool)[flat.size - pool:]
+    indices = indices[np.argsort(flat[indices])[::-1]]
+    peaks = []
+    for index in indices:
+        score = float(flat[index])
+        if min_score is not None and score < min_score: return peaks
+        y, x = divmod(int(index), width)
+        if any(abs(x - px) < rx and abs(y - py) < ry for _, (px, py) in peaks): continue
+        peaks.append((score, (x, y)))
+        if len(peaks) == k: return peaks
+    if pool == flat.size: return peaks
+
+    work = scores.astype(np.float32, copy=True)
+    for _, (px, py) in peaks:
+        work[max(0, py - ry + 1):py + ry, max(0, px - rx + 1):px + rx] = -np.inf
+    while len(peaks) < k:
+        _, score, _, (x, y) = cv2.minMaxLoc(work)
+        if score == -np.inf or (min_score is not None and score < min_score): break
+        peaks.append((float(score), (x, y)))
+        work[max(0, y - ry + 1):y + ry, max(0, x - rx + 1):x + rx] = -np.inf
+    return peaks
+
+
+class Frame:
+    """單一幀的擷取結果：同一個 tick 內所有模板都在這張灰階畫面上比對"""
+
+    def __init__(self, gray, rgb=None, timestamp=None, origin=(0, 0)):
+        self.gray = gray
+        self.rgb = rgb
+        self.origin = origin  # 擷取區域左上角在螢幕上的座標
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.results = {}  # template_key -> MatchResult，同一幀不重複比對
+        self.seq = 0
+        # 與上一幀相比有變化的區域 [(x0, y0, x1, y1), ...]；[] 代表畫面靜止，None 代表無法比較
+        self.changed_boxes = None
+        self._pyramid = [gray]
+
+    def level(self, n):
+        """第 n 層金字塔影像（每層縮小一半），同一幀內只計算一次"""
+        while len(self._pyramid) <= n:
+            self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+        return self._pyramid[n]
+
+    @property
+    def width(self):
+        return self.gray.shape[1]
+
+    @property
+    def height(self):
+        return self.gray.shape[0]
+
+    def to_screen(self, point):
+        return (point[0] + self.origin[0], point[1] + self.origin[1])
+
+
+class ChangeDetector:
+    """以縮圖逐格比較目前畫面與參考畫面，找出有變化的區域
+
+    縮圖為原畫面的 1/scale（每 scale x scale 個像素取平均），每 tile x tile 個縮圖像素為一格；
+    任一縮圖像素差異超過 tolerance 即視為該格有變化，相鄰的變化格合併為一個矩形。
+    寬高不是 scale 倍數時，右側與下方剩下的窄條以原解析度比較。
+
+    參考畫面不是上一幀：只有回報為變化的區域才更新成目前的內容，其餘區域保留上次重新比對時的內容，
+    因此逐幀都低於 tolerance 的漸變（例如淡入的 Boss）累積超過 tolerance 時仍會回報。
+    這仍是近似：沿用的分數對應的畫面與目前畫面在縮圖上最多相差 tolerance。
+    scale=1、tolerance=0 時逐像素比較，結果與不使用閘門完全相同。
+    """
+
+    def __init__(self, scale=4, tile=16, tolerance=6):
+        self.scale = scale
+        self.tile = tile
+        self.tolerance = tolerance
+        self._previous = None  # ((參考縮圖, 右側窄條, 下方窄條), origin, frame shape)
+
+    def reset(self):
+        self._previous = None
+
+    def update(self, frame):
+        gray = frame.gray
+        h, w = gray.shape
+        # 只縮整數倍的部分，縮圖像素與原畫面的 scale x scale 區塊一一對應
+        sh, sw = h - h % self.scale, w - w % self.scale
+        if sh and sw:
+            thumbnail = cv2.resize(gray[:sh, :sw], (sw // self.scale, sh // self.scale), interpolation=cv2.INTER_AREA)
+        else:
+            thumbnail = np.empty((0, 0), np.uint8)
+        right, bottom = gray[:, sw:].copy(), gray[sh:, :sw].copy()
+        previous = self._previous
+        if previous is None or previous[1:] != (frame.origin, gray.shape):
+            self._previous = ((thumbnail, right, bottom), frame.origin, gray.shape)
+            return None
+
+        # 參考畫面只在回報變化的範圍更新（就地修改）
+        old_thumbnail, old_right, old_bottom = previous[0]
+        boxes = self._strip_boxes(right, old_right, bottom, old_bottom, sw, sh, w, h)
+        changed = cv2.absdiff(thumbnail, old_thumbnail) > self.tolerance if thumbnail.size else None
+        if changed is None or not changed.any(): return boxes
+        th, tw = changed.shape
+        rows, cols = -(-th // self.tile), -(-tw // self.tile)
+        padded = np.zeros((rows * self.tile, cols * self.tile), np.bool_)
+        padded[:th, :tw] = changed
+        tiles = padded.reshape(rows, self.tile, cols, self.tile).any(axis=(1, 3)).astype(np.uint8)
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+        block = self.tile * self.scale
+        for x, y, bw, bh, _ in stats[1:count]:
+            boxes.append((x * block, y * block, min(sw, (x + bw) * block), min(sh, (y + bh) * block)))
+            area = (slice(y * self.tile, (y + bh) * self.tile), slice(x * self.tile, (x + bw) * self.tile))
+            old_thumbnail[area] = thumbnail[area]
+        return boxes
+
+    def _strip_boxes(self, right, old_right, bottom, old_bottom, sw, sh, w, h):
+        """右側 / 下方不足 scale 的窄條以原解析度比較，回傳有變化的範圍"""
+        boxes = []
+        if right.size:
+            rows = np.flatnonzero((cv2.absdiff(right, old_right) > self.tolerance).any(axis=1))
+            if rows.size:
+                boxes.append((sw, int(rows[0]), w, int(rows[-1]) + 1))
+                old_right[rows[0]:rows[-1] + 1] = right[rows[0]:rows[-1] + 1]
+        if bottom.size:
+            cols = np.flatnonzero((cv2.absdiff(bottom, old_bottom) > self.tolerance).any(axis=0))
+            if cols.size:
+                boxes.append((int(cols[0]), sh, int(cols[-1]) + 1, h))
+                old_bottom[:, cols[0]:cols[-1] + 1] = bottom[:, cols[0]:cols[-1] + 1]
+        return boxes
+
+
+class MatchResult:
+    """單一模板在某一幀上的比對結果"""
+    __slots__ = ("key", "score", "loc", "size", "threshold")
+
+    def __init__(self, key, score, loc, size, threshold):
+        self.key = key
+        self.score = score
+        self.loc = loc      # 左上角 (x, y)；模板未載入或比螢幕大時為 None
+        self.size = size    # (w, h)
+        self.threshold = threshold
+
+    @property
+    def valid(self):
+        return self.loc is not None
+
+    @property
+    def found(self):
+        return self.valid and self.score >= self.threshold
+
+    @property
+    def center(self):
+        if self.loc is None: return None
+        return (self.loc[0] + self.size[0] // 2, self.loc[1] + self.size[1] // 2)
+
+    def __repr__(self):
+        return f"MatchResult({self.key!r}, score={self.score:.3f}, loc={self.loc}, found={self.found})"
+
+
+class FrameMatcher:
+    """每個 tick 只擷取一次畫面，並在同一幀上比對多個模板"""
+
+    def __init__(self, templates, threshold, rois=None, roi_padding=48, capture=None, template_cache=None):
+        self.templates = templates  # 與 GameBot.templates 共用同一個 dict
+        self.threshold = threshold  # callable，例如 confidence_var.get
+        self.thresholds = {}        # key -> 校正過的閾值 (calibrate.py)，優先於 threshold()
+        self.capture_backend = capture or create_capture()
+        # ROI 格式皆為 (x, y, w, h)；先搜尋加上 padding 的小視窗，未命中才搜尋全螢幕
+        self.rois = dict(rois or {})  # 手動設定的 ROI
+        self.learned_rois = {}        # 上一次成功比對的位置
+        self.roi_padding = roi_padding
+        # 金字塔模式：key -> 縮小層數。全螢幕搜尋改為先在縮小畫面找候選，再在原解析度精修
+        self.pyramid_levels = {}
+        self.pyramid_candidates = 3
+        self._template_pyramids = {}  # key -> (原模板, [各層模板])
+        # 模板庫：bank 名稱 -> [template keys]，模板本體存在 bank_templates
+        self.banks = {}
+        self.bank_templates = {}
+        # 畫面變化閘門：畫面靜止時沿用上一幀結果，只有變化區域需要重新比對
+        self.change_gating = True
+        self.change_detector = ChangeDetector()
+        self._frame_seq = 0
+        self._last_raw = {}  # key -> (模板, score, loc, frame seq)
+        self.stats = {"full": 0, "partial": 0, "reused": 0}
+        # 模板快取 (templateStore.TemplateCache)：解碼後的灰階圖與前 cache_levels 層金字塔直接 memmap 載入
+        self.template_cache = template_cache
+        self.cache_levels = 2
+        # botMetrics.Metrics；設定後記錄擷取與各模板比對耗時
+        self.metrics = None
+        # 多尺度模式：平常只用快取的尺度比對，連續 miss 達門檻才重新搜尋一次最佳尺度；
+        # 搜尋仍找不到時門檻變為 4 倍，模板長時間不在畫面上也不會頻繁搜尋
+        self.scale_search = False
+        self.scale_steps = DEFAULT_SCALES
+        self.scale_miss_limit = 5
+        self.scales = {}              # key -> 尺度（依顯示器保存，見 templateStore.load_scales）；每個模板各自搜尋
+        self.on_scale_change = None   # callable(key, scale)
+        self._scaled = {}             # key -> (原模板, 尺度, 縮放後模板)
+        self._scale_misses = {}       # key -> (連續 miss 次數, 目前門檻)
+
+    def set_roi(self, key, roi):
+        if roi is None: self.rois.pop(key, None)
+        else: self.rois[key] = tuple(roi)
+
+    def forget_roi(self, key):
+        """模板重新載入後，舊的學習位置不再可信"""
+        self.learned_rois.pop(key, None)
+
+    def read_template(self, key, path):
+        """讀取灰階模板；有快取時一併帶入預先算好的金字塔，讀取失敗回傳 None"""
+        if self.template_cache is None:
+            return cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        pyramid = self.template_cache.load(path, self.cache_levels)
+        if pyramid is None: return None
+        self._template_pyramids[key] = (pyramid[0], list(pyramid))
+        return pyramid[0]
+
+    def load_template(self, key, path):
+        """載入單一模板到 templates[key]，回傳灰階陣列或 None"""
+        image = self.read_template(key, path)
+        if image is None: return None
+        self.templates[key] = image
+        self.forget_roi(key)
+        return image
+
+    def load_bank(self, name, directory):
+        """從資料夾載入一組模板（例如 static/boss/），key 為 "<name>/<檔名>"，回傳載入的 keys"""
+        for key in self.banks.pop(name, []):
+            self.bank_templates.pop(key, None)
+            self.forget_roi(key)
+        keys = []
+        for filename in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in (".png", ".jpg", ".jpeg"): continue
+            key = f"{name}/{stem}"
+            image = self.read_template(key, os.path.join(directory, filename))
+            if image is None: continue
+            self.bank_templates[key] = image
+            keys.append(key)
+        self.banks[name] = keys
+        return keys
+
+    def get_template(self, key):
+        template = self.templates.get(key)
+        if template is None: template = self.bank_templates.get(key)
+        return template
+
+    def set_pyramid(self, key, levels):
+        """levels 為 0 或 None 時關閉該模板的金字塔模式"""
+        if levels: self.pyramid_levels[key] = int(levels)
+        else: self.pyramid_levels.pop(key, None)
+
+    def capture(self, keep_color=False, region=None):
+        """region 為 (x, y, w, h)；回傳的 Frame 以擷取區域為座標原點"""
+        return self.admit(self.grab_frame(keep_color, region))
+
+    def grab_frame(self, keep_color=False, region=None):
+        """只擷取畫面，尚未編號也還沒做變化偵測；FramePipeline 在背景執行緒呼叫"""
+        started = time.perf_counter()
+        gray, rgb = self.capture_backend.grab(region, keep_color)
+        if self.metrics is not None:
+            self.metrics.observe("capture_seconds", time.perf_counter() - started, backend=self.capture_backend.name)
+        origin = (region[0], region[1]) if region else (0, 0)
+        return Frame(gray, rgb, origin=origin)
+
+    def admit(self, frame):
+        """依比對順序替幀編號，並與上一個比對的幀做變化偵測（被丟棄的幀不算）"""
+        self._frame_seq += 1
+        frame.seq = self._frame_seq
+        if self.change_gating:
+            started = time.perf_counter()
+            frame.changed_boxes = self.change_detector.update(frame)
+            if self.metrics is not None: self.metrics.observe("change_detect_seconds", time.perf_counter() - started)
+        return frame
+
+    def match(self, frame, keys):
+        """回傳 {key: MatchResult}，已在此幀比對過的模板直接沿用結果"""
+        threshold = self.threshold()
+        results = {}
+        for key in keys:
+            result = frame.results.get(key)
+            if result is None:
+                started = time.perf_counter()
+                result = self._match_one(frame, key, self.thresholds.get(key, threshold))
+                frame.results[key] = result
+                if self.metrics is not None:
+                    self.metrics.observe("match_seconds", time.perf_counter() - started, template=key)
+            results[key] = result
+        return results
+
+    def match_one(self, frame, key):
+        return self.match(frame, [key])[key]
+
+    def score_map(self, frame, key):
+        """回傳完整的 matchTemplate 結果矩陣，供詳細分析使用"""
+        template = self._effective_template(key)
+        if template is None or not self._fits(frame.gray, template): return None
+        return cv2.matchTemplate(frame.gray, template, cv2.TM_CCOEFF_NORMED)
+
+    def find_all(self, frame, key, max_count=10, threshold=None, scores=None):
+        """找出同一個模板在畫面上的多個位置（例如同時出現多隻 Boss），回傳達到閾值的 [MatchResult]
+
+        互相重疊超過半個模板的位置只保留分數最高者；scores 可傳入已算好的 score_map 避免重算。
+        """
+        if threshold is None: threshold = self.thresholds.get(key, self.threshold())
+        template = self._effective_template(key)
+        if scores is None: scores = self.score_map(frame, key)
+        if scores is None: return []
+        h, w = template.shape
+        peaks = find_peaks(scores, max_count, radius=(w // 2 + 1, h // 2 + 1), min_score=threshold)
+        return [MatchResult(key, score, loc, (w, h), threshold) for score, loc in peaks]
+
+    def _effective_template(self, key):
+        """實際比對用的模板：多尺度模式下為目前尺度縮放後的模板"""
+        template = self.get_template(key)
+        if template is None or not self.scale_search: return template
+        return self._scaled_template(key, template, self.scales.get(key, 1.0))
+
+    def _fits(self, gray, template):
+        return template.shape[0] <= gray.shape[0] and template.shape[1] <= gray.shape[1]
+
+    def _match_one(self, frame, key, threshold):
+        template = self.get_template(key)
+        if template is None:
+            return MatchResult(key, 0.0, None, (0, 0), threshold)
+        if not self.scale_search:
+            return self._match_template(frame, key, template, threshold)
+
+        scale = self.scales.get(key, 1.0)
+        result = self._match_template(frame, key, self._scaled_template(key, template, scale), threshold)
+        misses, limit = self._scale_misses.get(key, (0, self.scale_miss_limit))
+        if result.found:
+            self._scale_misses[key] = (0, self.scale_miss_limit)
+            return result
+        if misses + 1 < limit:
+            self._scale_misses[key] = (misses + 1, limit)
+            return result
+
+        started = time.perf_counter()
+        best = self._search_scale(frame, template, threshold)
+        if self.metrics is not None:
+            self.metrics.observe("scale_search_seconds", time.perf_counter() - started, template=key)
+        if best is None:
+            self._scale_misses[key] = (0, min(limit * 4, self.scale_miss_limit * 256))
+            return result
+        self._scale_misses[key] = (0, self.scale_miss_limit)
+        if best != scale:
+            self.scales[key] = best
+            self.forget_roi(key)
+            if self.on_scale_change: self.on_scale_change(key, best)
+        return self._match_template(frame, key, self._scaled_template(key, template, best), threshold)
+
+    def _match_template(self, frame, key, template, threshold):
+        h, w = template.shape
+        if not self._fits(frame.gray, template):
+            return MatchResult(key, 0.0, None, (w, h), threshold)
+
+        gated = self._gated_match(frame, key, template)
+        if gated is not None:
+            max_val, max_loc = gated
+            if max_val >= threshold: self.learned_rois[key] = (max_loc[0], max_loc[1], w, h)
+            self._last_raw[key] = (template, max_val, max_loc, frame.seq)
+            return MatchResult(key, max_val, max_loc, (w, h), threshold)
+        self.stats["full"] += 1
+        max_val, max_loc = self._full_match(frame, key, template, threshold)
+        self._last_raw[key] = (template, max_val, max_loc, frame.seq)
+        return MatchResult(key, max_val, max_loc, (w, h), threshold)
+
+    def _gated_match(self, frame, key, template):
+        """上一幀的結果仍然有效時回傳 (score, loc)，否則回傳 None 交給完整比對
+
+        TM_CCOEFF_NORMED 在某位置的分數只取決於模板覆蓋的像素，因此在 ChangeDetector 找出的變化範圍內：
+        - 畫面靜止：沿用上一幀的分數與位置
+        - 只有部分區域變化，且上次最佳位置不在變化區域內：只需重新比對會碰到變化區域的位置
+        ChangeDetector 預設會忽略相對於上次重新比對時低於 tolerance 的細微變化，此時沿用的是近似結果，見 ChangeDetector。
+        """
+        if not self.change_gating or frame.changed_boxes is None: return None
+        cached = self._last_raw.get(key)
+        if cached is None or cached[0] is not template or cached[3] != frame.seq - 1: return None
+        _, score, loc, _ = cached
+        if not frame.changed_boxes:
+            self.stats["reused"] += 1
+            return score, loc
+
+        h, w = template.shape
+        windows = []
+        for x0, y0, x1, y1 in frame.changed_boxes:
+            if loc[0] < x1 and x0 < loc[0] + w and loc[1] < y1 and y0 < loc[1] + h:
+                return None  # 上次最佳位置本身變了，第二名未知，只能重新比對
+            # 所有模板範圍會與此區域重疊的位置
+            windows.append((max(0, x0 - w + 1), max(0, y0 - h + 1), min(frame.width, x1 + w - 1), min(frame.height, y1 + h - 1)))
+        if sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in windows) > frame.width * frame.height // 2:
+            return None
+
+        self.stats["partial"] += 1
+        for x0, y0, x1, y1 in windows:
+            if y1 - y0 < h or x1 - x0 < w: continue
+            val, window_loc = self._search(frame.gray[y0:y1, x0:x1], template)
+            if val > score:
+                score, loc = val, (window_loc[0] + x0, window_loc[1] + y0)
+        return score, loc
+
+    def _full_match(self, frame, key, template, threshold):
+        h, w = template.shape
+
+        # 先在學習到的 / 設定的 ROI 附近搜尋
+        for roi in self._candidate_rois(key):
+            window = self._padded_window(frame.gray, roi, template.shape)
+            if window is None: continue
+            x0, y0, x1, y1 = window
+            max_val, max_loc = self._search(frame.gray[y0:y1, x0:x1], template)
+            if max_val >= threshold:
+                loc = (max_loc[0] + x0, max_loc[1] + y0)
+                self.learned_rois[key] = (loc[0], loc[1], w, h)
+                return max_val, loc
+
+        # ROI 未命中，退回全螢幕搜尋
+        levels = self._usable_levels(template, self.pyramid_levels.get(key, 0))
+        if levels:
+            max_val, max_loc = self._pyramid_search(frame, key, template, levels)
+        else:
+            max_val, max_loc = self._search(frame.gray, template)
+        if max_val >= threshold:
+            self.learned_rois[key] = (max_loc[0], max_loc[1], w, h)
+        return max_val, max_loc
+
+    def _candidate_rois(self, key):
+        rois = []
+        for roi in (self.learned_rois.get(key), self.rois.get(key)):
+            if roi is not None and roi not in rois: rois.append(roi)
+        return rois
+
+    def _padded_window(self, gray, roi, template_shape):
+        """回傳裁切到畫面內的 (x0, y0, x1, y1)；視窗放不下模板時回傳 None"""
+        x, y, w, h = roi
+        pad = self.roi_padding
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(gray.shape[1], x + w + pad), min(gray.shape[0], y + h + pad)
+        if y1 - y0 < template_shape[0] or x1 - x0 < template_shape[1]: return None
+        # 視窗已涵蓋整個畫面時，交給全螢幕搜尋即可
+        if (x0, y0, x1, y1) == (0, 0, gray.shape[1], gray.shape[0]): return None
+        return x0, y0, x1, y1
+
+    def _search(self, gray, template):
+        result = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return float(max_val), max_loc
+
+    def _usable_levels(self, template, levels):
+        # 縮小後模板太小會失去辨識度，至少保留 8px
+        while levels > 0 and min(template.shape) >> levels < 8:
+            levels -= 1
+        return levels
+
+    def _template_level(self, key, template, levels):
+        cached = self._template_pyramids.get(key)
+        if cached is None or cached[0] is not template:
+            pyramid = [template]
+            for _ in range(levels):
+                pyramid.append(cv2.pyrDown(pyramid[-1]))
+            cached = (template, pyramid)
+            self._template_pyramids[key] = cached
+        pyramid = cached[1]
+        while len(pyramid) <= levels:
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        return pyramid[levels]
+
+    def _resize(self, template, scale):
+        h, w = template.shape
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        return cv2.resize(template, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+    def _scaled_template(self, key, template, scale):
+        """同一個 (模板, 尺度) 回傳同一個陣列，ROI、金字塔與變化閘門的快取才能沿用"""
+        if scale == 1.0: return template
+        cached = self._scaled.get(key)
+        if cached is None or cached[0] is not template or cached[1] != scale:
+            cached = (template, scale, self._resize(template, scale))
+            self._scaled[key] = cached
+        return cached[2]
+
+    def _search_scale(self, frame, template, threshold):
+        """在整張畫面上試遍 scale_steps，回傳分數最高且達到 threshold 的尺度，都沒有則回傳 None
+
+        與金字塔模式相同：先在縮小的畫面上替每個尺度找出最佳位置，只有前兩名在原解析度的候選附近確認。
+        """
+        th, tw = template.shape
+        steps = [s for s in self.scale_steps if round(th * s) <= frame.height and round(tw * s) <= frame.width]
+        if not steps: return None
+        levels = 2
+        while levels and min(th, tw) >> levels < 10:
+            levels -= 1
+        small, factor = frame.level(levels), 1 << levels
+        coarse = []
+        for scale in steps:
+            small_template = self._resize(template, scale / factor)
+            if self._fits(small, small_template):
+                coarse.append((self._search(small, small_template), scale))
+        coarse.sort(key=lambda c: c[0][0], reverse=True)
+
+        best_val, best_scale = threshold, None
+        pad = 2 * factor
+        for (_, (cx, cy)), scale in coarse[:2]:
+            scaled = self._resize(template, scale)
+            h, w = scaled.shape
+            x0, y0 = max(0, cx * factor - pad), max(0, cy * factor - pad)
+            x1, y1 = min(frame.width, cx * factor + w + pad), min(frame.height, cy * factor + h + pad)
+            if y1 - y0 < h or x1 - x0 < w: continue
+            val, _ = self._search(frame.gray[y0:y1, x0:x1], scaled)
+            if val >= best_val: best_val, best_scale = val, scale
+        return best_scale
+
+    def _pyramid_search(self, frame, key, template, levels):
+        """在縮小的畫面上找出前幾個候選位置，只在候選附近以原解析度精修
+
+        回傳的分數一律是原解析度的 TM_CCOEFF_NORMED，與信心度設定的意義相同。
+        """
+        small_frame = frame.level(levels)
+        small_template = self._template_level(key, template, levels)
+        if not self._fits(small_frame, small_template):
+            return self._search(frame.gray, template)
+        coarse = cv2.matchTemplate(small_frame, small_template, cv2.TM_CCOEFF_NORMED)
+
+        scale = 1 << levels
+        th, tw = template.shape
+        sh, sw = small_template.shape
+        pad = 2 * scale
+        best_val, best_loc = -1.0, (0, 0)
+        # 候選彼此相距至少半個模板，精修的是不同位置
+        for _, (cx, cy) in find_peaks(coarse, self.pyramid_candidates, radius=(sw // 2 + 1, sh // 2 + 1)):
+            x0, y0 = max(0, cx * scale - pad), max(0, cy * scale - pad)
+            x1 = min(frame.width, cx * scale + tw + pad)
+            y1 = min(frame.height, cy * scale + th + pad)
+            if y1 - y0 < th or x1 - x0 < tw: continue
+            val, loc = self._search(frame.gray[y0:y1, x0:x1], template)
+            if val > best_val:
+                best_val, best_loc = val, (loc[0] + x0, loc[1] + y0)
+        return best_val, best_loc
+
+
+class FramePipeline:
+    """背景執行緒以目標幀率擷取畫面放進環狀緩衝區，比對端依序取出
+
+    比對跟不上時丟棄最舊的幀，畫面延遲最多 ring 幀；擷取、灰階轉換與 matchTemplate 都會釋放 GIL，
+    擷取下一幀與比對這一幀可以同時進行。同一時間只能有一個執行緒使用 matcher 擷取畫面。
+    佇列中的幀與 get() 最近回傳的幀都向擷取後端保留 (hold) 緩衝區，下一次 get() 才釋放上一幀，
+    丟棄的幀立即釋放，擷取端不會覆寫正在比對的畫面。
+    """
+
+    def __init__(self, matcher, fps=15, ring=2):
+        self.matcher = matcher
+        self.fps = fps
+        self.ring = max(1, ring)
+        self.captured = 0
+        self.dropped = 0
+        self.consumed = 0
+        self.error = None
+        self._frames = collections.deque()
+        self._current = None  # get() 最近回傳、可能仍在比對中的幀
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # 比對中 1 幀 + 緩衝區 ring 幀 + 正在擷取 1 幀，都不能共用同一個灰階緩衝區
+        self.matcher.capture_backend.ensure_buffers(self.ring + 2)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="frame-pipeline", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        # 等擷取執行緒真的結束，之後才能在其他執行緒使用擷取後端（例如 XShm 的共享緩衝區）
+        if self._thread is not None: self._thread.join()
+        backend = self.matcher.capture_backend
+        for frame in self._frames:
+            backend.release(frame.gray)
+        self._frames.clear()
+        if self._current is not None: backend.release(self._current.gray)
+        self._current = None
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_tick = time.perf_counter()
+        metrics = self.matcher.metrics
+        backend = self.matcher.capture_backend
+        while not self._stop.is_set():
+            try:
+                frame = self.matcher.grab_frame()
+            except Exception as e:
+                with self._condition:
+                    self.error = e
+                    self._condition.notify_all()
+                return
+            backend.hold(frame.gray)
+            with self._condition:
+                if len(self._frames) >= self.ring:
+                    backend.release(self._frames.popleft().gray)
+                    self.dropped += 1
+                    if metrics is not None: metrics.inc("frames_dropped_total")
+                self._frames.append(frame)
+                self.captured += 1
+                self._condition.notify()
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0: self._stop.wait(delay)
+            else: next_tick = time.perf_counter()  # 擷取本身比目標幀率慢時不補拍
+
+    def get(self, timeout=1.0):
+        """取出下一幀（已編號並做完變化偵測）；逾時或已停止回傳 None，擷取失敗時拋出該例外"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._frames or self.error or self._stop.is_set(), timeout)
+            if not self._frames:
+                if self.error is not None: raise self.error
+                return None
+            frame = self._frames.popleft()
+            if self._current is not None: self.matcher.capture_backend.release(self._current.gray)
+            self._current = frame
+        self.consumed += 1
+        if self.matcher.metrics is not None:
+            self.matcher.metrics.observe("frame_age_seconds", time.time() - frame.timestamp)
+        return self.matcher.admit(frame)
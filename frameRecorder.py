@@ -0,0 +1,134 @@
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import cv2
+from botLogging import logger
+
+
+class FrameRecorder:
+    """非同步保存畫面與比對資訊，用來累積實際執行時的標註資料
+
+    record() 只在呼叫端執行緒複製像素（必要時先裁切），PNG 編碼與寫檔交給背景執行緒池；
+    每張圖旁邊寫一個同名 .json 記錄分數、模板、狀態等資訊。資料夾總大小超過 max_bytes 時
+    從最舊的開始刪除；排隊中的工作超過 max_pending 時直接丟棄新的畫面，不拖慢掃描。
+    """
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, workers=2, max_pending=16,
+                 crop_margin=None, min_interval=2.0, prefix=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.crop_margin = crop_margin  # None 保存整個畫面，否則保存比對位置外擴 crop_margin 像素
+        self.min_interval = min_interval  # 同一種類、同一模板兩次保存的最短間隔（秒）
+        self.prefix = prefix
+        self.saved = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_saved = {}
+        self._sequence = itertools.count(1)  # 同一毫秒內的多張畫面也不會同名
+        self._files = collections.OrderedDict()  # base path -> bytes，由舊到新
+        self._usage = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan_existing()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max(1, workers), thread_name_prefix="recorder")
+
+    def _scan_existing(self):
+        groups = {}
+        for entry in os.scandir(self.directory):
+            base, ext = os.path.splitext(entry.path)
+            if not entry.is_file() or ext.lower() not in self.IMAGE_EXTENSIONS + (".json",): continue
+            stat = entry.stat()
+            size, mtime = groups.get(base, (0, stat.st_mtime))
+            groups[base] = (size + stat.st_size, min(mtime, stat.st_mtime))
+        for base, (size, _) in sorted(groups.items(), key=lambda item: item[1][1]):
+            self._files[base] = size
+            self._usage += size
+
+    def record(self, frame, kind, result=None, state=None, extra=None, min_interval=None):
+        """排入一張畫面，回傳將寫入的檔名（不含副檔名）；因間隔或佇列已滿而略過時回傳 None
+
+        kind 例如 "detection" / "near_threshold" / "analysis"；result 為 MatchResult。
+        """
+        template = result.key if result is not None else None
+        now = time.time()
+        interval = self.min_interval if min_interval is None else min_interval
+        with self._lock:
+            last = self._last_saved.get((kind, template))
+            if last is not None and now - last < interval: return None
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return None
+            self._pending += 1
+            self._last_saved[(kind, template)] = now
+            sequence = next(self._sequence)
+
+        image = frame.rgb if frame.rgb is not None else frame.gray
+        crop = (0, 0, frame.width, frame.height)
+        if self.crop_margin is not None and result is not None and result.loc is not None:
+            m = self.crop_margin
+            x0, y0 = max(0, result.loc[0] - m), max(0, result.loc[1] - m)
+            x1 = min(frame.width, result.loc[0] + result.size[0] + m)
+            y1 = min(frame.height, result.loc[1] + result.size[1] + m)
+            crop = (x0, y0, x1 - x0, y1 - y0)
+        x, y, w, h = crop
+        # 擷取緩衝區會被重複使用，必須在這裡複製
+        image = image[y:y + h, x:x + w].copy()
+
+        metadata = {
+            "time": now, "kind": kind, "state": state, "frame_seq": frame.seq,
+            "origin": list(frame.origin), "crop": list(crop), "color": frame.rgb is not None,
+        }
+        if result is not None:
+            metadata.update(template=result.key, score=round(result.score, 4), threshold=result.threshold,
+                            found=result.found, loc=list(result.loc) if result.loc else None, size=list(result.size))
+        if extra: metadata.update(extra)
+
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}-{sequence:04d}"
+        parts = [self.prefix, stamp, kind, template]
+        name = "_".join(re.sub(r"[^\w.-]", "-", p) for p in parts if p)
+        base = os.path.join(self.directory, name)
+        self._executor.submit(self._write, image, base, metadata)
+        return base
+
+    def _write(self, image, base, metadata):
+        try:
+            if metadata["color"]: image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            if not cv2.imwrite(base + ".png", image):
+                raise OSError(f"cv2.imwrite 失敗: {base}.png")
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False)
+            size = os.path.getsize(base + ".png") + os.path.getsize(base + ".json")
+            with self._lock:
+                self._files[base] = size
+                self._usage += size
+                self.saved += 1
+                expired = []
+                while self._usage > self.max_bytes and len(self._files) > 1:
+                    old, old_size = self._files.popitem(last=False)
+                    self._usage -= old_size
+                    expired.append(old)
+            for old in expired:
+                for ext in self.IMAGE_EXTENSIONS + (".json",):
+                    try:
+                        os.remove(old + ext)
+                    except FileNotFoundError:
+                        pass
+        except Exception as e:
+            logger.warning("保存畫面失敗 %s: %s", base, e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @property
+    def usage(self):
+        return self._usage
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,79 @@
+"""無介面 (headless) 模式：讀取設定檔後直接執行狀態機，適合交給 systemd / supervisord 等監控程式管理
+
+用法:
+    python hunter.py --config bot.json
+    python hunter.py --config bot.json --gui     # 以相同設定開啟 Tk 介面
+
+config.example.json 可作為起點。static/ 只附上按鈕模板（見 static/templates.json）；登入畫面與選角畫面的
+指示器 (login_scene_indicator / char_select_scene_indicator) 依遊戲解析度與語系而不同，需自行截圖後
+在 templates 填入路徑，或在 GUI 載入（記錄在 user_manifest）。未載入時以結束碼 2 結束並列出缺少的模板。
+
+設定檔有 clients 時進入多開模式，每個遊戲視窗由一個工作行程負責（見 multiHunter.py）。
+
+結束碼: 0 = 收到 SIGINT/SIGTERM 正常結束，1 = 找不到畫面元素而停止（監控程式應重新啟動），2 = 設定錯誤
+"""
+import argparse
+import signal
+import sys
+from botConfig import load_config
+from botLogging import LEVELS, logger, setup_logging
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Artale Boss Hunter 無介面模式")
+    parser.add_argument("--config", help="JSON 設定檔（模板路徑、閾值、等待時間、webhook、日誌）")
+    parser.add_argument("--log-level", choices=list(LEVELS), help="覆寫設定檔中的日誌等級")
+    parser.add_argument("--gui", action="store_true", help="改用 Tk 圖形介面")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    if args.log_level: config["logging"]["level"] = args.log_level
+
+    if args.gui:
+        from bossDetect import GameBot
+        GameBot(config).run_gui()
+        return 0
+
+    log_config = config["logging"]
+    setup_logging(LEVELS[log_config["level"]], log_file=log_config["file"], max_bytes=log_config["max_bytes"],
+                  backups=log_config["backups"], capacity=log_config["capacity"], console=True)
+
+    if config["clients"]:
+        return run_clients(config)
+
+    from botCore import HunterBot
+    bot = HunterBot(config)
+    bot.load_configured_templates()
+    missing = bot.missing_templates()
+    if missing:
+        logger.error("設定檔缺少模板: %s", ", ".join(missing))
+        return 2
+
+    def handle_signal(signum, _frame):
+        logger.info("收到訊號 %s，準備結束...", signal.Signals(signum).name)
+        bot.stop("收到結束訊號")
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    try:
+        bot.run()
+    finally:
+        bot.close()
+    return 1 if bot.failed else 0
+
+
+def run_clients(config):
+    from multiHunter import ClientCoordinator
+    coordinator = ClientCoordinator(config)
+
+    def handle_signal(signum, _frame):
+        logger.info("收到訊號 %s，通知所有視窗結束...", signal.Signals(signum).name)
+        coordinator.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    return coordinator.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import threading
+import time
+
+
+class InputBackend:
+    """送出滑鼠鍵盤事件的介面；pos 為螢幕座標 (x, y)，key 為 pyautogui 的按鍵名稱"""
+    name = "base"
+
+    def click(self, pos):
+        raise NotImplementedError
+
+    def press(self, key):
+        raise NotImplementedError
+
+
+class PyAutoGuiInput(InputBackend):
+    """pyautogui 的全域 PAUSE 設為 0，動作後的等待改由 InputDriver 依動作決定"""
+    name = "pyautogui"
+
+    def __init__(self, failsafe=True):
+        import pyautogui
+        pyautogui.FAILSAFE = failsafe
+        pyautogui.PAUSE = 0
+        self._pyautogui = pyautogui
+
+    def click(self, pos):
+        self._pyautogui.click(int(pos[0]), int(pos[1]))
+
+    def press(self, key):
+        self._pyautogui.press(key)
+
+
+class FakeInput(InputBackend):
+    """不送出任何事件，只記錄動作；測試或搭配 ReplayCapture 試跑流程用
+
+    on_action(action, arg) 在每個動作後呼叫，可用來切換重播的畫面。
+    """
+    name = "fake"
+
+    def __init__(self, failsafe=True, on_action=None):
+        self.actions = []  # [(time, "click" / "press", pos 或 key)]
+        self.on_action = on_action
+
+    def click(self, pos):
+        self._record("click", (int(pos[0]), int(pos[1])))
+
+    def press(self, key):
+        self._record("press", key)
+
+    def _record(self, action, arg):
+        self.actions.append((time.time(), action, arg))
+        if self.on_action: self.on_action(action, arg)
+
+
+class InputDriver:
+    """包裝輸入後端，每個動作後只等待該動作需要的時間，取代 pyautogui 對所有動作一律 PAUSE
+
+    delays 例如 {"click": 0.05, "press": 0.05, "press:esc": 0.15, "click:login_button": 0.3}；
+    "動作:標籤" 優先於 "動作"，都沒有時使用 "default"。click 的標籤由呼叫端給（通常是模板名稱），
+    press 的標籤為按鍵。多個執行緒共用時以 lock 保證動作與其後的等待不會交錯。
+    """
+
+    def __init__(self, backend, delays=None):
+        self.backend = backend
+        self.delays = dict(delays or {})
+        self.name = getattr(backend, "name", type(backend).__name__)
+        self._lock = threading.Lock()
+
+    def delay(self, action, label=None):
+        default = self.delays.get(action, self.delays.get("default", 0.0))
+        return self.delays.get(f"{action}:{label}", default) if label is not None else default
+
+    def click(self, pos, label=None):
+        with self._lock:
+            result = self.backend.click(pos)
+            self._settle(self.delay("click", label))
+        return result
+
+    def press(self, key):
+        with self._lock:
+            result = self.backend.press(key)
+            self._settle(self.delay("press", key))
+        return result
+
+    def _settle(self, seconds):
+        if seconds > 0: time.sleep(seconds)
+
+
+BACKENDS = {"pyautogui": PyAutoGuiInput, "fake": FakeInput}
+
+
+def create_input(config, backend=None, delays=None):
+    """依設定 (config["input"]) 建立 InputDriver；backend 為已建立的後端（例如多開模式的 InputProxy）"""
+    if backend is None:
+        backend = BACKENDS[config["backend"]](failsafe=config["failsafe"])
+    return InputDriver(backend, config["delays"] if delays is None else delays)
@@ -0,0 +1,319 @@
+"""多開模式：每個遊戲視窗一個工作行程，各自執行 HunterBot 狀態機
+
+協調行程 (ClientCoordinator) 負責：
+- 每個 tick 只擷取一次涵蓋所有視窗的畫面，寫入共享記憶體，各工作行程切出自己的區域比對
+- 依序執行所有滑鼠／鍵盤動作，不同視窗的點擊不會交錯；按鍵前先點一下該視窗取得焦點
+- 工作行程因找不到畫面元素而停止時，等 restart_delay 秒後重新啟動
+
+設定檔範例:
+    "clients": [
+        {"name": "ch-a", "region": [0, 0, 1280, 720]},
+        {"name": "ch-b", "region": [1280, 0, 1280, 720], "focus": [640, 20]}
+    ]
+region 為視窗在螢幕上的 (x, y, w, h)；focus 為取得焦點時點擊的視窗內座標，預設為視窗中心。
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from botLogging import LEVELS, logger, setup_logging
+from inputDriver import InputBackend, create_input
+from screenCapture import CaptureBackend, create_capture
+
+
+class SharedScreen:
+    """協調行程寫入、工作行程讀取的共享灰階畫面
+
+    寫入與讀取都持有同一個 Condition，讀取端不會拿到寫到一半的畫面；
+    seq 每發佈一幀加一，讀取端據此等待比上次更新的畫面。
+    """
+
+    def __init__(self, shape, name=None, seq=None, condition=None, context=None):
+        self.shape = tuple(shape)
+        # 工作行程以 spawn 啟動，與協調行程共用同一個 resource_tracker，只有協調行程會 unlink
+        self._shm = shared_memory.SharedMemory(name=name, create=name is None, size=self.shape[0] * self.shape[1])
+        self.name = self._shm.name
+        self.array = np.ndarray(self.shape, np.uint8, buffer=self._shm.buf)
+        self.seq = seq if seq is not None else context.RawValue("Q", 0)
+        self.condition = condition if condition is not None else context.Condition()
+
+    def attach_args(self):
+        return self.shape, self.name, self.seq, self.condition
+
+    def publish(self, gray):
+        with self.condition:
+            np.copyto(self.array, gray)
+            self.seq.value += 1
+            self.condition.notify_all()
+
+    def read(self, out, box, after, timeout=1.0):
+        """等待序號大於 after 的畫面（最多 timeout 秒，逾時則沿用目前畫面），把 box 區域複製到 out，回傳序號"""
+        x, y, w, h = box
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq.value > after, timeout)
+            np.copyto(out, self.array[y:y + h, x:x + w])
+            return self.seq.value
+
+    def close(self, unlink=False):
+        self.array = None
+        self._shm.close()
+        if unlink: self._shm.unlink()
+
+
+class ClientLink:
+    """工作行程對協調行程的請求通道；每個請求都等協調行程執行完才返回，逾時回傳 None"""
+
+    def __init__(self, index, requests, replies, timeout=10):
+        self.index = index
+        self.requests = requests
+        self.replies = replies
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    def request(self, action, *args):
+        request_id = next(self._ids)
+        self.requests.put((self.index, request_id, action, args))
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                reply_id, value = self.replies.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                logger.warning("協調行程 %s 秒內沒有回應 [%s]", self.timeout, action)
+                return None
+            if reply_id == request_id: return value  # 較早逾時請求的遲到回覆直接丟棄
+
+
+class InputProxy(InputBackend):
+    """工作行程的輸入後端；座標為視窗內座標，由協調行程換算並依序執行"""
+    name = "proxy"
+
+    def __init__(self, link):
+        self.link = link
+
+    def click(self, pos):
+        return self.link.request("click", int(pos[0]), int(pos[1]))
+
+    def press(self, key):
+        return self.link.request("press", key)
+
+
+class SharedFrameCapture(CaptureBackend):
+    """工作行程的擷取後端：從共享畫面切出自己的視窗，彩色截圖向協調行程索取"""
+    name = "shared"
+
+    def __init__(self, screen, region, link, buffers=2):
+        super().__init__(buffers)
+        self.screen = screen
+        self.region = region  # 視窗在共享畫面中的 (x, y, w, h)
+        self.link = link
+        self._seen = 0
+
+    def screen_size(self):
+        return self.region[2], self.region[3]
+
+    def grab(self, region=None, keep_color=False):
+        x, y, w, h = region if region else (0, 0, self.region[2], self.region[3])
+        gray = self._gray_buffer(h, w)
+        self._seen = self.screen.read(gray, (self.region[0] + x, self.region[1] + y, w, h), self._seen)
+        rgb = None
+        if keep_color:
+            rgb = self.link.request("snapshot")
+            if rgb is not None: rgb = rgb[y:y + h, x:x + w]
+        return gray, rgb
+
+    def close(self):
+        self.screen.close()
+
+
+def _per_client(path, name):
+    """在副檔名前加上視窗名稱，例如 .cache/channels.json -> .cache/channels.ch-a.json；path 為空時原樣回傳"""
+    if not path: return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def _client_main(config, index, screen_args, requests, replies, stop_event):
+    """工作行程進入點：結束碼 0 = 正常停止，1 = 找不到畫面元素，2 = 模板不齊"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由協調行程處理
+    client = config["clients"][index]
+    name = client["name"]
+    log_config = config["logging"]
+    log_file = _per_client(log_config["file"], name)  # 多個行程不能輪替同一個檔案
+    setup_logging(LEVELS[log_config["level"]], log_file=log_file, max_bytes=log_config["max_bytes"],
+                  backups=log_config["backups"], capacity=log_config["capacity"], console=True, tag=name)
+
+    metrics = config["metrics"]
+    if metrics["port"] or metrics["dump_file"]:
+        # 每個視窗各自的指標：port 依序往後排，匯出檔加上視窗名稱
+        metrics = dict(metrics, port=metrics["port"] and metrics["port"] + index + 1,
+                       dump_file=_per_client(metrics["dump_file"], name))
+        config = dict(config, metrics=metrics)
+    # 頻道紀錄與場景特徵每次都整個檔案重寫，多個行程共用同一個檔案時會互相蓋掉
+    config = dict(config, channels=dict(config["channels"], history=_per_client(config["channels"]["history"], name)),
+                  scenes=dict(config["scenes"], store=_per_client(config["scenes"]["store"], name)))
+
+    from botCore import HunterBot
+    link = ClientLink(index, requests, replies, config["multi"]["request_timeout"])
+    capture = SharedFrameCapture(SharedScreen(*screen_args), client["local_region"], link)
+    bot = HunterBot(config, capture=capture, input_driver=InputProxy(link), name=name)
+    bot.load_configured_templates()
+    missing = bot.missing_templates()
+    if missing:
+        logger.error("缺少模板: %s", ", ".join(missing))
+        bot.close()
+        sys.exit(2)
+
+    def watch_stop():
+        stop_event.wait()
+        bot.stop("收到結束訊號")
+
+    threading.Thread(target=watch_stop, daemon=True).start()
+    try:
+        if not stop_event.is_set(): bot.run()
+    finally:
+        bot.close()
+    sys.exit(1 if bot.failed else 0)
+
+
+class ClientCoordinator:
+    """多開模式的協調行程：擷取畫面、執行輸入動作、監控工作行程"""
+
+    def __init__(self, config):
+        self.config = config
+        self.clients = []
+        for i, client in enumerate(config["clients"]):
+            client = dict(client, name=client.get("name") or f"client{i + 1}", region=tuple(client["region"]))
+            self.clients.append(client)
+        if not self.clients:
+            raise ValueError("設定檔沒有 clients")
+        x0 = min(c["region"][0] for c in self.clients)
+        y0 = min(c["region"][1] for c in self.clients)
+        x1 = max(c["region"][0] + c["region"][2] for c in self.clients)
+        y1 = max(c["region"][1] + c["region"][3] for c in self.clients)
+        self.bbox = (x0, y0, x1 - x0, y1 - y0)  # 每個 tick 只擷取這個範圍一次
+        for client in self.clients:
+            x, y, w, h = client["region"]
+            client["local_region"] = (x - x0, y - y0, w, h)
+
+        self.context = multiprocessing.get_context("spawn")
+        self.screen = SharedScreen((self.bbox[3], self.bbox[2]), context=self.context)
+        self.requests = self.context.Queue()
+        self.replies = [self.context.Queue() for _ in self.clients]
+        self.stop_event = self.context.Event()
+        self.processes = [None] * len(self.clients)
+        self.restart_at = {}
+        self.exit_codes = {}
+        self.capture = None
+        self.input = None
+        self._focused = None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        """阻塞直到所有工作行程結束；回傳 2 代表有工作行程模板不齊，否則回傳 0"""
+        multi = self.config["multi"]
+        self.capture = create_capture(self.config["capture_backend"])
+        # 各動作後的等待由工作行程自己的 InputDriver 負責，協調行程只在切換焦點後稍等，不拖住其他視窗
+        delays = self.config["input"]["delays"]
+        self.input = create_input(self.config["input"], delays={"click:focus": delays.get("click:focus", 0.05)})
+        logger.info("多開模式: %d 個視窗，擷取範圍 %s，擷取方式 %s", len(self.clients), self.bbox, self.capture.name)
+        for i in range(len(self.clients)):
+            self._start_worker(i)
+
+        interval = multi["capture_interval"]
+        next_tick = time.perf_counter()
+        shutdown_deadline = None
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= next_tick:
+                    gray, _ = self.capture.grab(self.bbox)
+                    self.screen.publish(gray)
+                    next_tick = now + interval
+                    if self.stop_event.is_set() and shutdown_deadline is None:
+                        shutdown_deadline = now + multi["shutdown_timeout"]
+                    if not self._supervise(now) or (shutdown_deadline and now > shutdown_deadline): break
+                try:
+                    index, request_id, action, args = self.requests.get(timeout=max(0.0, next_tick - time.perf_counter()))
+                except queue.Empty:
+                    continue
+                self.replies[index].put((request_id, self._perform(index, action, args)))
+        finally:
+            self.stop_event.set()
+            for process in self.processes:
+                if process is None: continue
+                process.join(timeout=1)
+                if process.is_alive(): process.terminate()
+            self.screen.close(unlink=True)
+            self.capture.close()
+        return 2 if 2 in self.exit_codes.values() else 0
+
+    def _start_worker(self, index):
+        client = self.clients[index]
+        process = self.context.Process(
+            target=_client_main, name=client["name"], daemon=True,
+            args=(dict(self.config, clients=self.clients), index, self.screen.attach_args(),
+                  self.requests, self.replies[index], self.stop_event))
+        process.start()
+        self.processes[index] = process
+        logger.info("已啟動 [%s] (pid %s)，視窗區域 %s", client["name"], process.pid, client["region"])
+
+    def _supervise(self, now):
+        """回傳是否仍有工作行程在執行或等待重新啟動"""
+        active = False
+        for i, process in enumerate(self.processes):
+            name = self.clients[i]["name"]
+            if process is not None and process.is_alive():
+                active = True
+                continue
+            if process is not None:
+                self.exit_codes[i] = process.exitcode
+                self.processes[i] = None
+                if process.exitcode == 1 and not self.stop_event.is_set():
+                    delay = self.config["multi"]["restart_delay"]
+                    logger.warning("[%s] 找不到畫面元素而停止，%s 秒後重新啟動", name, delay)
+                    self.restart_at[i] = now + delay
+                else:
+                    logger.info("[%s] 已結束 (結束碼 %s)", name, process.exitcode)
+            if i in self.restart_at:
+                if self.stop_event.is_set():
+                    del self.restart_at[i]
+                    continue
+                active = True
+                if now >= self.restart_at[i]:
+                    del self.restart_at[i]
+                    self._start_worker(i)
+        return active
+
+    def _perform(self, index, action, args):
+        client = self.clients[index]
+        x0, y0, w, h = client["region"]
+        if action == "snapshot":
+            gray, rgb = self.capture.grab(self.bbox, keep_color=True)
+            self.screen.publish(gray)
+            lx, ly = client["local_region"][:2]
+            return rgb[ly:ly + h, lx:lx + w].copy()
+        if action == "click":
+            x, y = args
+            if not (0 <= x < w and 0 <= y < h):
+                logger.warning("[%s] 點擊座標 (%d, %d) 超出視窗範圍，已忽略", client["name"], x, y)
+                return False
+            self.input.click((x0 + x, y0 + y))
+            self._focused = index
+            return True
+        if action == "press":
+            if self._focused != index:
+                fx, fy = client.get("focus") or (w // 2, h // 2)
+                self.input.click((x0 + fx, y0 + fy), label="focus")
+                self._focused = index
+            self.input.press(*args)
+            return True
+        logger.error("未知的請求: %s", action)
+        return None
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+import cv2
+import requests
+
+
+class Notification:
+    """一則待發送的通知；image 為 RGB numpy 陣列，在背景執行緒才編碼"""
+
+    def __init__(self, content, image=None, filename="boss_detected"):
+        self.content = content
+        self.image = image
+        self.filename = filename
+        self.attempts = 0
+
+
+class NotificationDispatcher:
+    """背景發送 Discord webhook 通知，狀態機只負責把通知放進佇列
+
+    - 佇列有上限，滿了會丟掉最舊的一則
+    - 共用同一個 requests.Session（保持連線）
+    - 429 依 Retry-After 等待；網路錯誤與 5xx 以指數退避重試
+    - 附圖可縮小並以 JPEG 編碼，減少上傳時間
+    """
+
+    def __init__(self, webhook_url="", log=print, max_queue=16, max_retries=5, backoff=1.0, max_backoff=60.0,
+                 timeout=10.0, attachment_scale=0.5, attachment_format="jpeg", jpeg_quality=80, session=None):
+        self.webhook_url = webhook_url
+        self.log = log
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.attachment_scale = attachment_scale
+        self.attachment_format = attachment_format
+        self.jpeg_quality = jpeg_quality
+        self.session = session or requests.Session()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive(): return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=5.0):
+        """等待佇列中的通知送完（最多 timeout 秒）後停止背景執行緒"""
+        if self._thread is None: return
+        deadline = time.time() + timeout
+        while not self._queue.empty() and time.time() < deadline:
+            time.sleep(0.05)
+        self._stop.set()
+        self._thread.join(max(0.0, deadline - time.time()))
+        self._thread = None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def notify(self, content, image=None, filename="boss_detected"):
+        """立即返回；佇列已滿時丟棄最舊的通知"""
+        if not self.webhook_url:
+            self.log("❌ 尚未設定 Discord Webhook URL，略過通知")
+            return False
+        item = Notification(content, image, filename)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                    self.log(f"⚠️ 通知佇列已滿，丟棄最舊的通知: {dropped.content}")
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._deliver(item)
+
+    def _deliver(self, item):
+        files = self._encode(item) if item.image is not None else None
+        data = {"content": item.content}
+        delay = self.backoff
+        while not self._stop.is_set():
+            item.attempts += 1
+            wait = None
+            try:
+                if files:
+                    response = self.session.post(self.webhook_url, data=data, files=files, timeout=self.timeout)
+                else:
+                    response = self.session.post(self.webhook_url, json=data, timeout=self.timeout)
+                if 200 <= response.status_code < 300:
+                    self.log("✅ Discord 通知發送成功！")
+                    return True
+                if response.status_code == 429:
+                    wait = self._retry_after(response)
+                    self.log(f"⚠️ Discord 速率限制，{wait:.1f} 秒後重試")
+                elif response.status_code < 500:
+                    self.log(f"❌ Discord 通知發送失敗: {response.status_code}, {response.text[:200]}")
+                    return False
+                else:
+                    self.log(f"⚠️ Discord 伺服器錯誤 {response.status_code}，稍後重試")
+            except requests.RequestException as e:
+                self.log(f"⚠️ 發送 Discord 通知時發生錯誤: {e}")
+
+            if item.attempts > self.max_retries:
+                self.log(f"❌ Discord 通知重試 {self.max_retries} 次後仍失敗，放棄: {item.content}")
+                return False
+            if wait is None:
+                wait, delay = delay, min(delay * 2, self.max_backoff)
+            self._stop.wait(min(wait, self.max_backoff))
+        return False
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if value is None:
+            try:
+                value = response.json().get("retry_after")
+            except ValueError:
+                value = None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return self.backoff
+
+    def _encode(self, item):
+        image = item.image
+        if self.attachment_scale and self.attachment_scale != 1.0:
+            image = cv2.resize(image, None, fx=self.attachment_scale, fy=self.attachment_scale, interpolation=cv2.INTER_AREA)
+        bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        if self.attachment_format == "png":
+            ok, encoded = cv2.imencode(".png", bgr)
+            name, mime = f"{item.filename}.png", "image/png"
+        else:
+            ok, encoded = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            name, mime = f"{item.filename}.jpg", "image/jpeg"
+        if not ok:
+            self.log("⚠️ 截圖編碼失敗，只發送文字通知")
+            return None
+        return {"file": (name, encoded.tobytes(), mime)}
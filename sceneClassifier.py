@@ -0,0 +1,135 @@
+import os
+import time
+import cv2
+import numpy as np
+from botLogging import logger
+
+
+class SceneClassifier:
+    """以整個畫面的縮圖特徵一次比對所有已知場景
+
+    每個場景保存數張參考縮圖（灰階、減去平均後正規化），分類時把目前畫面縮成同樣大小，
+    與所有參考做一次矩陣乘法即得到相關係數 (NCC)，整個畫面只處理一次，不受場景數量影響。
+    參考來自 samples 資料夾 (<scene>/*.png) 的截圖，以及執行中以模板確認過的畫面 (learn)；
+    後者保存在 store (.npz)，重新啟動後沿用；寫檔最多每 save_interval 秒一次，結束前以 flush() 寫入。
+    """
+
+    def __init__(self, store=None, samples=None, size=(64, 36), min_score=0.9, margin=0.05, floor=0.5,
+                 max_references=8, save_interval=60.0):
+        self.store = store
+        self.size = tuple(size)
+        self.min_score = min_score  # 最高分低於此值視為不明確
+        self.margin = margin        # 前兩名的分數差距小於此值視為不明確
+        self.floor = floor          # 低於此分數的場景不列入候選
+        self.max_references = max_references  # 每個場景最多保留幾張學到的參考，超過時丟棄最舊的
+        self.save_interval = save_interval
+        self._dirty = False
+        self._saved_at = None
+        self._learned = {}  # scene -> [signature, ...]，由舊到新
+        self._samples = {}  # scene -> [signature, ...]
+        self._matrix = None
+        self._labels = None
+        self._load_store()
+        if samples and os.path.isdir(samples): self._load_samples(samples)
+
+    def _load_store(self):
+        if not self.store or not os.path.isfile(self.store): return
+        try:
+            with np.load(self.store) as data:
+                for scene in data.files:
+                    references = data[scene]
+                    if references.ndim == 2 and references.shape[1] == self.size[0] * self.size[1]:
+                        self._learned[scene] = list(references)
+        except (OSError, ValueError) as e:
+            logger.warning("無法讀取場景特徵 %s: %s", self.store, e)
+
+    def _load_samples(self, directory):
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if not entry.is_dir(): continue
+            for name in sorted(os.listdir(entry.path)):
+                image = cv2.imread(os.path.join(entry.path, name), cv2.IMREAD_GRAYSCALE)
+                if image is not None: self._samples.setdefault(entry.name, []).append(self.signature(image))
+
+    @property
+    def scenes(self):
+        return sorted(set(self._learned) | set(self._samples))
+
+    def signature(self, gray):
+        thumbnail = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        thumbnail -= thumbnail.mean()
+        norm = np.linalg.norm(thumbnail)
+        # 單色畫面（黑畫面、載入中）沒有特徵，與任何參考的相關係數都是 0
+        return thumbnail / norm if norm > 1e-6 else thumbnail
+
+    def scores(self, frame):
+        """回傳 {scene: 與該場景最像的參考之相關係數}"""
+        if self._matrix is None: self._rebuild()
+        if not len(self._labels): return {}
+        similarity = self._matrix @ self.signature(frame.gray)
+        best = np.full(len(self._names), -1.0, np.float32)
+        np.maximum.at(best, self._labels, similarity)
+        return dict(zip(self._names, best.tolist()))
+
+    def classify(self, frame):
+        """回傳 (scene, candidates)
+
+        分數夠高且明顯領先時 scene 為場景名稱；否則 scene 為 None，candidates 依分數列出
+        與最高分差距在 margin 內的場景，交給呼叫端以模板確認。沒有任何場景的分數達到 floor 時
+        candidates 為 []。
+        """
+        ranked = sorted(self.scores(frame).items(), key=lambda item: item[1], reverse=True)
+        if not ranked: return None, []
+        best = ranked[0][1]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        if best >= self.min_score and best - runner_up >= self.margin: return ranked[0][0], [ranked[0][0]]
+        floor = max(self.floor, best - self.margin)
+        return None, [scene for scene, score in ranked if score >= floor]
+
+    def learn(self, scene, frame):
+        """把已確認場景的畫面加入參考；與既有參考幾乎相同時略過，回傳是否有新增"""
+        signature = self.signature(frame.gray)
+        if not signature.any(): return False
+        references = self._learned.setdefault(scene, [])
+        known = references + self._samples.get(scene, [])
+        if known and max(float(reference @ signature) for reference in known) >= 0.98: return False
+        references.append(signature)
+        del references[:-self.max_references]
+        self._matrix = None
+        self._dirty = True
+        if self._saved_at is None or time.monotonic() - self._saved_at >= self.save_interval: self.save()
+        return True
+
+    def forget(self, scene=None):
+        """清除執行中學到的參考（scene 為 None 時清除全部）"""
+        if scene is None: self._learned.clear()
+        else: self._learned.pop(scene, None)
+        self._matrix = None
+        self.save()
+
+    def flush(self):
+        """寫入還沒保存的參考"""
+        if self._dirty: self.save()
+
+    def save(self):
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if not self.store: return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.store)), exist_ok=True)
+            tmp = f"{self.store}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **{scene: np.array(refs) for scene, refs in self._learned.items() if refs})
+            os.replace(tmp, self.store)
+        except OSError as e:
+            logger.warning("無法保存場景特徵 %s: %s", self.store, e)
+
+    def _rebuild(self):
+        self._names = self.scenes
+        rows, labels = [], []
+        for index, scene in enumerate(self._names):
+            for reference in self._samples.get(scene, []) + self._learned.get(scene, []):
+                rows.append(reference)
+                labels.append(index)
+        length = self.size[0] * self.size[1]
+        self._matrix = np.array(rows, np.float32).reshape(len(rows), length)
+        self._labels = np.array(labels, np.intp)
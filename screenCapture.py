@@ -0,0 +1,330 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+import cv2
+import numpy as np
+
+
+class CaptureBackend:
+    """螢幕擷取介面：grab() 直接輸出灰階畫面，並重複使用預先配置的緩衝區
+
+    灰階緩衝區以輪替方式使用（預設 2 個），上一幀在下一次 grab() 之後仍然有效，
+    但呼叫端若要長期保存畫面必須自行 copy()。以 hold() 保留的緩衝區在 release() 之前不會被輪替覆寫，
+    例如 FramePipeline 佇列中與正在比對的幀。
+    """
+    name = "base"
+
+    def __init__(self, buffers=2):
+        self.buffer_count = max(1, buffers)
+        self._gray_buffers = []
+        self._next_buffer = 0
+        self._held = set()  # 保留中的緩衝區 id
+        self._held_lock = threading.Lock()
+
+    def screen_size(self):
+        raise NotImplementedError
+
+    def grab(self, region=None, keep_color=False):
+        """region 為 (x, y, w, h)，None 代表全螢幕；回傳 (gray, rgb 或 None)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def ensure_buffers(self, count):
+        """同時持有的幀數會超過緩衝區數量時（例如 FramePipeline）先加大"""
+        if count > self.buffer_count:
+            self.buffer_count = count
+            self._gray_buffers = []
+
+    def hold(self, buffer):
+        """grab() 回傳的灰階畫面在 release() 之前不會被之後的 grab() 覆寫"""
+        with self._held_lock:
+            self._held.add(id(buffer))
+
+    def release(self, buffer):
+        with self._held_lock:
+            self._held.discard(id(buffer))
+
+    def _gray_buffer(self, height, width):
+        with self._held_lock:
+            if not self._gray_buffers or self._gray_buffers[0].shape != (height, width):
+                # 舊緩衝區仍由持有者引用，不會被重複使用，保留紀錄也不再需要
+                self._gray_buffers = [np.empty((height, width), np.uint8) for _ in range(self.buffer_count)]
+                self._next_buffer = 0
+                self._held.clear()
+            for _ in range(self.buffer_count):
+                buffer = self._gray_buffers[self._next_buffer]
+                self._next_buffer = (self._next_buffer + 1) % self.buffer_count
+                if id(buffer) not in self._held: return buffer
+        # 全部都被保留時另外配置，不覆寫任何持有中的畫面
+        return np.empty((height, width), np.uint8)
+
+
+class PyAutoGuiCapture(CaptureBackend):
+    """後備方案：跨平台但較慢，每次擷取仍會產生一張 PIL 影像"""
+    name = "pyautogui"
+
+    def __init__(self, buffers=2):
+        super().__init__(buffers)
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def screen_size(self):
+        return tuple(self._pyautogui.size())
+
+    def grab(self, region=None, keep_color=False):
+        screenshot = self._pyautogui.screenshot(region=tuple(region) if region else None)
+        rgb = np.asarray(screenshot)
+        gray = self._gray_buffer(rgb.shape[0], rgb.shape[1])
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY, dst=gray)
+        return gray, (rgb if keep_color else None)
+
+
+# --- X11 MIT-SHM ---
+
+class _XImage(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_int), ("height", ctypes.c_int), ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int), ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int), ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int), ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong), ("green_mask", ctypes.c_ulong), ("blue_mask", ctypes.c_ulong),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p), ("readOnly", ctypes.c_int),
+    ]
+
+
+_ZPixmap = 2
+_AllPlanes = 0xFFFFFFFF
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+class XShmCapture(CaptureBackend):
+    """X11 共享記憶體擷取：X server 直接把畫面寫進共享記憶體，不經過 socket 傳輸
+
+    支援只擷取子區域；灰階轉換直接寫入預先配置的 numpy 緩衝區。
+    """
+    name = "xshm"
+
+    def __init__(self, buffers=2, display=None):
+        super().__init__(buffers)
+        self._x11 = self._load("X11")
+        self._xext = self._load("Xext")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._declare()
+
+        self._display = self._x11.XOpenDisplay(display.encode() if display else None)
+        if not self._display:
+            raise RuntimeError("無法連線到 X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            self._x11.XCloseDisplay(self._display)
+            raise RuntimeError("X server 不支援 MIT-SHM")
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XRootWindow(self._display, screen)
+        self._visual = self._x11.XDefaultVisual(self._display, screen)
+        self._depth = self._x11.XDefaultDepth(self._display, screen)
+        self._size = (self._x11.XDisplayWidth(self._display, screen), self._x11.XDisplayHeight(self._display, screen))
+        self._image = None
+        self._shminfo = None
+        self._view = None
+
+    @staticmethod
+    def _load(name):
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise RuntimeError(f"找不到 lib{name}")
+        return ctypes.CDLL(path)
+
+    def _declare(self):
+        x11, xext, libc = self._x11, self._xext, self._libc
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_char_p,
+                                         ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def screen_size(self):
+        return self._size
+
+    def _ensure_image(self, width, height):
+        if self._image is not None and (self._image.contents.width, self._image.contents.height) == (width, height):
+            return
+        self._release_image()
+        shminfo = _XShmSegmentInfo()
+        image = self._xext.XShmCreateImage(self._display, self._visual, self._depth, _ZPixmap, None,
+                                           ctypes.byref(shminfo), width, height)
+        if not image:
+            raise RuntimeError("XShmCreateImage 失敗")
+        if image.contents.bits_per_pixel != 32:
+            self._x11.XDestroyImage(image)
+            raise RuntimeError("只支援 32 bpp 的 X visual")
+        size = image.contents.bytes_per_line * height
+        shminfo.shmid = self._libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            self._x11.XDestroyImage(image)
+            raise OSError(ctypes.get_errno(), "shmget 失敗")
+        shminfo.shmaddr = self._libc.shmat(shminfo.shmid, None, 0)
+        image.contents.data = shminfo.shmaddr
+        shminfo.readOnly = 0
+        self._xext.XShmAttach(self._display, ctypes.byref(shminfo))
+        self._x11.XSync(self._display, 0)
+        # 雙方都已 attach，先標記刪除，程式結束時系統會自動回收
+        self._libc.shmctl(shminfo.shmid, _IPC_RMID, None)
+
+        self._image, self._shminfo = image, shminfo
+        stride = image.contents.bytes_per_line // 4
+        raw = (ctypes.c_uint8 * size).from_address(shminfo.shmaddr)
+        self._view = np.frombuffer(raw, np.uint8).reshape(height, stride, 4)[:, :width]  # BGRA
+
+    def grab(self, region=None, keep_color=False):
+        x, y, w, h = region if region else (0, 0, self._size[0], self._size[1])
+        self._ensure_image(w, h)
+        if not self._xext.XShmGetImage(self._display, self._root, self._image, x, y, _AllPlanes):
+            raise RuntimeError("XShmGetImage 失敗")
+        gray = self._gray_buffer(h, w)
+        cv2.cvtColor(self._view, cv2.COLOR_BGRA2GRAY, dst=gray)
+        rgb = cv2.cvtColor(self._view, cv2.COLOR_BGRA2RGB) if keep_color else None
+        return gray, rgb
+
+    def _release_image(self):
+        if self._image is None: return
+        self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+        self._image.contents.data = None
+        self._x11.XDestroyImage(self._image)
+        self._libc.shmdt(self._shminfo.shmaddr)
+        self._image = self._shminfo = self._view = None
+
+    def close(self):
+        if self._display:
+            self._release_image()
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+class ReplayFinished(Exception):
+    """錄製的畫面已全部播放完畢"""
+
+
+class ReplayCapture(CaptureBackend):
+    """離線重播：從圖片資料夾或影片依序讀取畫面，取代實際螢幕擷取
+
+    每次 grab() 前進一幀；current_name 為目前畫面的檔名（影片則為幀編號），用來對應標註。
+    """
+    name = "replay"
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def __init__(self, source, loop=False, buffers=2):
+        super().__init__(buffers)
+        self.source = source
+        self.loop = loop
+        self.current_name = None
+        self._index = 0
+        self._video = None
+        self._paths = None
+        if os.path.isdir(source):
+            self._paths = [os.path.join(source, f) for f in sorted(os.listdir(source))
+                           if os.path.splitext(f)[1].lower() in self.IMAGE_EXTENSIONS]
+            if not self._paths:
+                raise ValueError(f"{source} 內沒有圖片")
+            first = cv2.imread(self._paths[0], cv2.IMREAD_GRAYSCALE)
+            self._size = (first.shape[1], first.shape[0])
+        else:
+            self._video = cv2.VideoCapture(source)
+            if not self._video.isOpened():
+                raise ValueError(f"無法開啟影片 {source}")
+            self._size = (int(self._video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._video.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def __len__(self):
+        if self._paths is not None: return len(self._paths)
+        return int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def screen_size(self):
+        return self._size
+
+    def skip(self, count):
+        """略過 count 幀不解碼（影片仍需逐幀 grab）"""
+        for _ in range(max(0, count)):
+            if self._paths is not None:
+                if self._index >= len(self._paths): return
+            elif not self._video.grab():
+                return
+            self._index += 1
+
+    def rewind(self):
+        self._index = 0
+        if self._video is not None: self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _read(self):
+        if self._paths is not None:
+            if self._index >= len(self._paths): return None, None
+            path = self._paths[self._index]
+            return cv2.imread(path, cv2.IMREAD_COLOR), os.path.basename(path)
+        ok, bgr = self._video.read()
+        return (bgr if ok else None), str(self._index)
+
+    def grab(self, region=None, keep_color=False):
+        bgr, name = self._read()
+        if bgr is None and self.loop and self._index > 0:
+            self.rewind()
+            bgr, name = self._read()
+        if bgr is None:
+            raise ReplayFinished(self.source)
+        self._index += 1
+        self.current_name = name
+        if region:
+            x, y, w, h = region
+            bgr = bgr[y:y + h, x:x + w]
+        gray = self._gray_buffer(bgr.shape[0], bgr.shape[1])
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+        return gray, (cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB) if keep_color else None)
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+BACKENDS = {"xshm": XShmCapture, "pyautogui": PyAutoGuiCapture}
+
+
+def create_capture(backend="auto", buffers=2):
+    """auto：Linux/X11 下優先使用 MIT-SHM，失敗時退回 pyautogui"""
+    if backend != "auto":
+        return BACKENDS[backend](buffers=buffers)
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        try:
+            return XShmCapture(buffers=buffers)
+        except (OSError, RuntimeError, AttributeError):
+            pass
+    return PyAutoGuiCapture(buffers=buffers)
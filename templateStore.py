@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import cv2
+import numpy as np
+
+MANIFEST_NAME = "templates.json"
+CACHE_VERSION = b"gray-pyrdown-v1"  # 前處理方式改變時更新，舊快取自動失效
+
+
+def load_manifest(path):
+    """讀取模板清單 {key: 圖片路徑}；相對路徑以清單所在資料夾為準，檔案不存在時回傳 {}"""
+    if not path or not os.path.isfile(path): return {}
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    return {key: os.path.normpath(os.path.join(root, p)) for key, p in entries.items() if p}
+
+
+def load_manifests(*paths):
+    """依序讀取多份模板清單，後面的清單覆蓋前面的（例如隨附清單 + 使用者清單）"""
+    entries = {}
+    for path in paths:
+        entries.update(load_manifest(path))
+    return entries
+
+
+def save_manifest(path, entries):
+    """寫回模板清單；位於清單資料夾內的圖片存成相對路徑，換電腦或搬資料夾也能用"""
+    root = os.path.dirname(os.path.abspath(path))
+    stored = {}
+    for key, p in sorted(entries.items()):
+        p = os.path.abspath(p)
+        stored[key] = os.path.relpath(p, root).replace(os.sep, "/") if p.startswith(root + os.sep) else p
+    os.makedirs(root, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stored, f, ensure_ascii=False, indent=4)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def load_scales(path, display):
+    """讀取某個顯示器 (例如 "2560x1440") 上各模板的最佳尺度 {key: scale}"""
+    if not path or not os.path.isfile(path): return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get(display, {})
+
+
+def save_scale(path, display, key, scale):
+    scales = {}
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            scales = json.load(f)
+    scales.setdefault(display, {})[key] = scale
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(scales, f, ensure_ascii=False, indent=4, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_thresholds(path):
+    """讀取 calibrate.py 產生的各模板閾值 {key: threshold}；檔案不存在時回傳 {}"""
+    if not path or not os.path.isfile(path): return {}
+    with open(path, encoding="utf-8") as f:
+        return {key: float(entry["threshold"]) for key, entry in json.load(f).items()}
+
+
+def save_thresholds(path, entries):
+    """entries 為 {key: {"threshold", "margin", ...}}；只更新給定的模板，其他模板的校正結果保留"""
+    stored = {}
+    if os.path.isfile(path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+    stored.update(entries)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stored, f, ensure_ascii=False, indent=4, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class TemplateCache:
+    """模板的前處理結果快取：灰階圖與金字塔各層存成 .npy，以 memmap 唯讀載入
+
+    快取以圖片檔內容的 SHA-1 為 key，同一張圖在任何電腦、任何路徑都對應同一份快取；
+    圖片內容一改就換 key，不會讀到過期資料。快取資料夾無法寫入時照樣回傳計算結果。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, path):
+        h = hashlib.sha1(CACHE_VERSION)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def load(self, path, levels=0):
+        """回傳 [原圖, 第 1 層, ..., 第 levels 層] 灰階陣列；圖片無法讀取時回傳 None
+
+        模板縮到 1px 以下就不再往下算，實際層數可能少於 levels。
+        """
+        try:
+            entry = os.path.join(self.directory, self.digest(path))
+        except OSError:
+            return None
+        pyramid = []
+        for n in range(levels + 1):
+            if n and min(pyramid[-1].shape) < 2: break
+            level = self._read(entry, n)
+            if level is None:
+                self.misses += 1
+                if n == 0:
+                    level = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                    if level is None: return None
+                else:
+                    level = cv2.pyrDown(np.asarray(pyramid[-1]))
+                level = self._write(entry, n, level)
+            else:
+                self.hits += 1
+            pyramid.append(level)
+        return pyramid
+
+    def _read(self, entry, n):
+        try:
+            return np.load(os.path.join(entry, f"level{n}.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, entry, n, array):
+        target = os.path.join(entry, f"level{n}.npy")
+        # 先寫暫存檔再改名，其他行程同時讀取也不會看到寫到一半的檔案
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(entry, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp, target)
+            return np.load(target, mmap_mode="r")
+        except OSError:
+            return array
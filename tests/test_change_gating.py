@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+from frameMatcher import ChangeDetector, Frame, FrameMatcher
+from screenCapture import CaptureBackend
+
+
+def make_matcher(template, gating):
+    matcher = FrameMatcher({"boss_indicator": template}, lambda: 0.8, capture=CaptureBackend())
+    matcher.change_gating = gating
+    matcher.change_detector = ChangeDetector(scale=4, tile=16, tolerance=6)
+    return matcher
+
+
+def fade_in(background, template, at, steps):
+    """Boss 在 steps 幀內從透明淡入，每幀的變化都低於 tolerance"""
+    x, y = at
+    h, w = template.shape
+    for i in range(steps + 1):
+        frame = background.copy()
+        region = frame[y:y + h, x:x + w].astype(np.float32)
+        frame[y:y + h, x:x + w] = np.round(region + (template - region) * i / steps).astype(np.uint8)
+        yield frame
+
+
+def test_gradual_fade_in_is_still_detected():
+    rng = np.random.default_rng(3)
+    background = cv2.resize((rng.random((18, 32)) * 255).astype(np.uint8), (640, 360))
+    template = cv2.GaussianBlur((rng.random((48, 64)) * 255).astype(np.uint8), (5, 5), 0)
+    gated, exact = make_matcher(template, True), make_matcher(template, False)
+    for gray in fade_in(background, template, (300, 160), 40):
+        gated_result = gated.match(gated.admit(Frame(gray)), ["boss_indicator"])["boss_indicator"]
+        exact_result = exact.match(exact.admit(Frame(gray)), ["boss_indicator"])["boss_indicator"]
+        assert abs(gated_result.score - exact_result.score) < 0.1
+    assert exact_result.found and gated_result.found
+    assert gated.stats["reused"] > 0  # 確實有沿用結果，而不是每幀都重新比對
+
+
+def test_static_screen_reports_no_change():
+    detector = ChangeDetector()
+    gray = np.full((100, 150), 80, np.uint8)
+    assert detector.update(Frame(gray)) is None
+    assert detector.update(Frame(gray.copy())) == []
@@ -0,0 +1,190 @@
+import cv2
+import numpy as np
+import pytest
+from botConfig import load_config
+from botCore import HunterBot
+from inputDriver import FakeInput
+from screenCapture import ReplayCapture
+
+WIDTH, HEIGHT = 320, 180
+BUTTON = (40, 20)
+# 模板 key -> 在畫面上的左上角
+LAYOUT = {
+    "login_button": (140, 120),
+    "char_select_scene_indicator": (10, 10),
+    "menu_channel_button": (200, 60),
+    "confirm_button": (100, 80),
+}
+# 場景 -> 畫面上有的模板
+SCENES = {
+    "login": ["login_button"],
+    "char_select": ["char_select_scene_indicator"],
+    "loading": [],
+    "in_game": [],
+    "esc_menu": ["menu_channel_button"],
+    "confirm": ["confirm_button"],
+}
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class StillReplay(ReplayCapture):
+    """每次擷取都停在 scene 對應的圖片上，畫面只會因為 on_action 切換場景而改變"""
+
+    def __init__(self, source, names):
+        super().__init__(source)
+        self.names = names
+        self.scene = names[0]
+
+    def grab(self, region=None, keep_color=False):
+        self.rewind()
+        self.skip(self.names.index(self.scene))
+        return super().grab(region, keep_color)
+
+
+class Game:
+    """依點擊位置與按鍵切換 StillReplay 的場景；transitions 為 {(場景, 模板或按鍵): 下一個場景}
+
+    ignore 為一開始要忽略的動作次數（模擬點擊沒有生效）。
+    """
+
+    def __init__(self, screen, transitions, ignore=0):
+        self.screen = screen
+        self.transitions = transitions
+        self.ignore = ignore
+
+    def on_action(self, action, arg):
+        target = arg if action == "press" else self._button_at(arg)
+        following = self.transitions.get((self.screen.scene, target))
+        if following is None: return
+        if self.ignore:
+            self.ignore -= 1
+            return
+        self.screen.scene = following
+
+    def _button_at(self, pos):
+        for key in SCENES[self.screen.scene]:
+            x, y = LAYOUT[key]
+            if x <= pos[0] < x + BUTTON[0] and y <= pos[1] < y + BUTTON[1]: return key
+        return None
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """寫出每個場景一張圖片與各模板，回傳 (圖片資料夾, 場景順序, 模板資料夾)"""
+    rng = np.random.default_rng(7)
+    patches = {key: (rng.random(BUTTON[::-1]) * 255).astype(np.uint8) for key in LAYOUT}
+    background = cv2.resize((rng.random((HEIGHT // 20, WIDTH // 20)) * 255).astype(np.uint8), (WIDTH, HEIGHT))
+    frames, templates = tmp_path / "frames", tmp_path / "templates"
+    frames.mkdir()
+    templates.mkdir()
+    names = list(SCENES)
+    for index, scene in enumerate(names):
+        image = background.copy()
+        for key in SCENES[scene]:
+            x, y = LAYOUT[key]
+            image[y:y + BUTTON[1], x:x + BUTTON[0]] = patches[key]
+        cv2.imwrite(str(frames / f"{index:02d}_{scene}.png"), image)
+    for key, patch in patches.items():
+        cv2.imwrite(str(templates / f"{key}.png"), patch)
+    return str(frames), names, templates
+
+
+@pytest.fixture
+def make_bot(recording):
+    frames, names, templates = recording
+
+    def make(scene, transitions, ignore=0, retries=2):
+        config = load_config()
+        config.update(manifest=None, user_manifest=None, template_cache=None, boss_bank=None, thresholds=None)
+        config["scale_search"].update(enabled=False, store=None)
+        config["scenes"]["enabled"] = False
+        config["input"].update(delays={}, verify_timeout=1.0, retries=retries)
+        screen = StillReplay(frames, names)
+        screen.scene = scene
+        game = Game(screen, transitions, ignore)
+        fake = FakeInput(on_action=game.on_action)
+        bot = HunterBot(config, capture=screen, input_driver=fake)
+        bot.clock = VirtualClock()
+        for key in LAYOUT:
+            assert bot.load_template(key, str(templates / f"{key}.png"))
+        bot.is_running = True
+        return bot, screen, fake
+
+    return make
+
+
+def center(key):
+    x, y = LAYOUT[key]
+    return (x + BUTTON[0] // 2, y + BUTTON[1] // 2)
+
+
+def clicks(fake):
+    return [arg for _, action, arg in fake.actions if action == "click"]
+
+
+def test_click_takes_effect_first_time(make_bot):
+    bot, screen, fake = make_bot("login", {("login", "login_button"): "char_select"})
+    pos = bot.find_and_click("login_button", expect="char_select_scene_indicator")
+    assert pos == center("login_button")
+    assert clicks(fake) == [pos]
+    assert screen.scene == "char_select"
+
+
+def test_click_without_effect_is_retried(make_bot):
+    bot, screen, fake = make_bot("login", {("login", "login_button"): "char_select"}, ignore=1)
+    pos = bot.find_and_click("login_button", expect="char_select_scene_indicator")
+    assert pos == center("login_button")
+    assert len(clicks(fake)) == 2
+    assert screen.scene == "char_select"
+
+
+def test_target_gone_on_retry_counts_as_success(make_bot):
+    # 點擊後進入載入畫面：預期的畫面還沒出現，但按鈕已經消失，不能再點一次
+    bot, screen, fake = make_bot("login", {("login", "login_button"): "loading"})
+    pos = bot.find_and_click("login_button", expect="char_select_scene_indicator")
+    assert pos == center("login_button")
+    assert len(clicks(fake)) == 1
+    assert screen.scene == "loading"
+
+
+def test_not_found_returns_none(make_bot):
+    bot, screen, fake = make_bot("loading", {})
+    assert bot.find_and_click("login_button", timeout=2, expect="char_select_scene_indicator") is None
+    assert fake.actions == []
+    assert bot.clock.time() >= 2
+
+
+def test_no_effect_after_retries_returns_false(make_bot):
+    bot, screen, fake = make_bot("login", {}, retries=2)
+    assert bot.find_and_click("login_button", expect="char_select_scene_indicator") is False
+    assert clicks(fake) == [center("login_button")] * 3
+
+
+def test_gone_expectation(make_bot):
+    bot, screen, fake = make_bot("confirm", {("confirm", "confirm_button"): "loading"}, ignore=1)
+    assert bot.find_and_click("confirm_button", expect="confirm_button", gone=True) == center("confirm_button")
+    assert len(clicks(fake)) == 2
+
+
+def test_press_is_verified(make_bot):
+    bot, screen, fake = make_bot("in_game", {("in_game", "esc"): "esc_menu", ("esc_menu", "esc"): "in_game"})
+    assert bot.press("esc", expect="menu_channel_button", retries=0) is True
+    assert screen.scene == "esc_menu"
+
+
+def test_toggle_press_without_retries_presses_once(make_bot):
+    bot, screen, fake = make_bot("in_game", {("in_game", "esc"): "esc_menu", ("esc_menu", "esc"): "in_game"},
+                                 ignore=1)
+    assert bot.press("esc", expect="menu_channel_button", retries=0) is False
+    assert [arg for _, action, arg in fake.actions] == ["esc"]
+    assert screen.scene == "in_game"
@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from frameMatcher import FrameMatcher, FramePipeline
+from screenCapture import CaptureBackend
+
+
+class CounterCapture(CaptureBackend):
+    """第 n 次擷取的畫面每個像素都是 n % 256，畫面被覆寫時一看就知道"""
+    name = "counter"
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def screen_size(self):
+        return (64, 48)
+
+    def grab(self, region=None, keep_color=False):
+        self.count += 1
+        gray = self._gray_buffer(48, 64)
+        gray.fill(self.count % 256)
+        return gray, None
+
+
+def test_slow_consumer_never_sees_its_frame_overwritten():
+    capture = CounterCapture()
+    matcher = FrameMatcher({}, lambda: 0.8, capture=capture)
+    pipeline = FramePipeline(matcher, fps=200, ring=2).start()
+    try:
+        consumed = 0
+        while consumed < 20:
+            frame = pipeline.get(timeout=1.0)
+            assert frame is not None
+            value = int(frame.gray[0, 0])
+            # 比對跟不上：擷取端在這段時間內會擷取並丟棄好幾幀
+            time.sleep(0.05)
+            assert np.all(frame.gray == value)
+            consumed += 1
+    finally:
+        pipeline.stop()
+    assert pipeline.dropped > 0
+    assert not capture._held
+
+
+def test_previous_frame_is_released_on_next_get():
+    capture = CounterCapture()
+    matcher = FrameMatcher({}, lambda: 0.8, capture=capture)
+    pipeline = FramePipeline(matcher, fps=200, ring=2).start()
+    try:
+        first = pipeline.get(timeout=1.0)
+        second = pipeline.get(timeout=1.0)
+        assert id(second.gray) in capture._held
+        assert id(first.gray) not in capture._held or first.gray is second.gray
+    finally:
+        pipeline.stop()
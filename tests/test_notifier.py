@@ -0,0 +1,168 @@
+import http.server
+import json
+import threading
+import time
+import numpy as np
+import pytest
+from notifier import NotificationDispatcher
+
+
+class StandInWebhook:
+    """本機假的 Discord webhook：依序回傳預先排好的 (status, headers)，記錄每個請求"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []  # (time, content type, body)
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stand_in.requests.append((time.monotonic(), self.headers.get("Content-Type", ""), body))
+                status, headers = stand_in.responses.pop(0) if stand_in.responses else (204, {})
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:%d/webhook" % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.requests) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.requests)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def webhook(request):
+    servers = []
+
+    def make(*responses):
+        server = StandInWebhook(responses)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def make_dispatcher(url, logs, **kwargs):
+    kwargs.setdefault("backoff", 0.05)
+    return NotificationDispatcher(url, log=logs.append, timeout=2, **kwargs)
+
+
+def test_success_sends_text_and_image(webhook):
+    server = webhook((204, {}), (200, {}))
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs)
+    dispatcher.start()
+    try:
+        assert dispatcher.notify("boss!")
+        assert dispatcher.notify("with image", image=np.zeros((40, 60, 3), np.uint8))
+        assert server.wait_for(2) == 2
+    finally:
+        dispatcher.close()
+    (_, text_type, text_body), (_, image_type, image_body) = server.requests
+    assert text_type.startswith("application/json")
+    assert json.loads(text_body) == {"content": "boss!"}
+    assert image_type.startswith("multipart/form-data")
+    assert b'filename="boss_detected.jpg"' in image_body
+    assert sum("成功" in line for line in logs) == 2
+
+
+def test_rate_limit_waits_for_retry_after(webhook):
+    server = webhook((429, {"Retry-After": "0.3"}), (204, {}))
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs)
+    dispatcher.start()
+    try:
+        dispatcher.notify("rate limited")
+        assert server.wait_for(2) == 2
+    finally:
+        dispatcher.close()
+    first, second = server.requests
+    assert second[0] - first[0] >= 0.3
+    assert any("速率限制" in line for line in logs)
+
+
+def test_server_errors_back_off_exponentially(webhook):
+    server = webhook((500, {}), (503, {}), (204, {}))
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs, backoff=0.1)
+    dispatcher.start()
+    try:
+        dispatcher.notify("flaky")
+        assert server.wait_for(3) == 3
+    finally:
+        dispatcher.close()
+    times = [t for t, _, _ in server.requests]
+    assert times[1] - times[0] >= 0.1
+    assert times[2] - times[1] >= 0.2  # 第二次等待加倍
+    assert any("成功" in line for line in logs)
+
+
+def test_gives_up_after_max_retries(webhook):
+    server = webhook(*[(500, {})] * 10)
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs, max_retries=2)
+    dispatcher.start()
+    try:
+        dispatcher.notify("never")
+        server.wait_for(3)
+        time.sleep(0.3)
+    finally:
+        dispatcher.close()
+    assert len(server.requests) == 3  # 第一次 + 重試 2 次
+    assert any("放棄" in line for line in logs)
+
+
+def test_client_error_is_not_retried(webhook):
+    server = webhook((400, {}), (204, {}))
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs)
+    dispatcher.start()
+    try:
+        dispatcher.notify("bad request")
+        server.wait_for(1)
+        time.sleep(0.2)
+    finally:
+        dispatcher.close()
+    assert len(server.requests) == 1
+
+
+def test_full_queue_drops_oldest(webhook):
+    server = webhook()
+    logs = []
+    dispatcher = make_dispatcher(server.url, logs, max_queue=2)
+    # 尚未啟動背景執行緒，通知全部留在佇列
+    for content in ("first", "second", "third"):
+        assert dispatcher.notify(content)
+    assert dispatcher.pending() == 2
+    assert any("丟棄最舊的通知: first" in line for line in logs)
+    dispatcher.start()
+    try:
+        assert server.wait_for(2) == 2
+        time.sleep(0.1)
+    finally:
+        dispatcher.close()
+    assert [json.loads(body)["content"] for _, _, body in server.requests] == ["second", "third"]
+
+
+def test_missing_webhook_url_is_skipped():
+    logs = []
+    dispatcher = NotificationDispatcher("", log=logs.append)
+    assert not dispatcher.notify("nowhere")
+    assert dispatcher.pending() == 0